@@ -1,4 +1,4 @@
-import sys, random, math, pygame
+import sys, random, math
 from time import time
 from .Sprite import Sprite
 from .constants import *
@@ -10,19 +10,12 @@ from functools import partial
 # actor class for four directional movement
 class Actor(Sprite):
     MAX_WEALTH = 500000
-    def __init__(self, actions, rect, tag=None, abortable=False, name=None):
-        # - scale images
-        self.actions = {}
-        self.masks = {}
-        for action in actions:
-            self.actions[action] = []
-            self.masks[action] = []
-            for img in actions[action]:
-                img = img.convert_alpha()
-                img = pygame.transform.scale(img, rect.size)
-                self.actions[action].append(img)
-                self.masks[action].append(pygame.mask.from_surface(img))
+    __slots__ = ('actions', 'index', 'action_iterations', 'action', 'action_loop', '_stop',
+                 'frame_count', 'frame_rate', 'prev_vector', 'direction', '_defend', '_health',
+                 '_wealth', '_energy', '_inventory', 'attributes')
 
+    def __init__(self, actions, rect, tag=None, abortable=False, name=None):
+        self.actions = Globals.transforms.frames(actions, rect.size)
 
         self.index = 0
         self.action_iterations = 0
@@ -189,9 +182,12 @@ class Actor(Sprite):
             self._defend(self)
 
         img = self.actions[self.action][self.index]
-        self.surface = img
-        self.origin_surface = img
-        self.mask = self.masks[self.action][self.index]
+        if img is not self.origin_surface:
+            self.origin_surface = img
+            if self._native(img):
+                self.surface = img
+            else:
+                self.needs_scale = True
         Sprite._update(self, delta)
         if self.action_loop == FOREVER or self.action_iterations < self.action_loop:
             self.frame_count = self.frame_count + 1
@@ -209,6 +205,13 @@ class Actor(Sprite):
             self.action = IDLE + '_' + self.direction
             self.action_loop = FOREVER
 
+    def _native(self, img):
+        """ true if a frame can be drawn as is (the actor isn't scaled or rotated) """
+        if self.rotate_angle != 0:
+            return False
+        size = int(self.sprite_scale_x * Globals.instance.GRID_SIZE), int(self.sprite_scale_y * Globals.instance.GRID_SIZE)
+        return img.get_size() == size
+
     def get_actions(self):
         """ return all actions that this actor can perform """
         return list(self.actions.keys())
@@ -61,3 +61,82 @@ class Animation:
 
         if self.callback:
             self.callback()
+
+class Animations:
+    """
+        the running animations, indexed by target object and by (object, action) so
+        lookups and removals don't need to scan every animation. iterating returns a
+        snapshot, animations can be added or removed while iterating.
+
+        when an `animator` backend (see `ArrayAnimator`) is attached, it is kept in
+        sync with the registry and updates all animations at once.
+    """
+    def __init__(self, animator=None):
+        self._all = {}
+        self._by_obj = {}
+        self._by_action = {}
+        self.animator = animator
+
+    def __len__(self):
+        return len(self._all)
+
+    def __iter__(self):
+        return iter(list(self._all))
+
+    def __contains__(self, animation):
+        return animation in self._all
+
+    def append(self, animation):
+        self._all[animation] = None
+        if self.animator is not None:
+            self.animator.add(animation)
+        obj = animation.obj
+        if obj not in self._by_obj:
+            self._by_obj[obj] = {}
+        self._by_obj[obj][animation] = None
+        key = (obj, animation.action)
+        if key not in self._by_action:
+            self._by_action[key] = {}
+        self._by_action[key][animation] = None
+
+    def remove(self, animation):
+        if animation not in self._all:
+            return
+        del self._all[animation]
+        if self.animator is not None:
+            self.animator.remove(animation)
+        obj = animation.obj
+        lst = self._by_obj[obj]
+        del lst[animation]
+        if len(lst) == 0:
+            del self._by_obj[obj]
+        key = (obj, animation.action)
+        lst = self._by_action[key]
+        del lst[animation]
+        if len(lst) == 0:
+            del self._by_action[key]
+
+    def get(self, obj, action=None):
+        """ the oldest animation of this object (and action) or None """
+        if action is None:
+            lst = self._by_obj.get(obj)
+        else:
+            lst = self._by_action.get((obj, action))
+        if lst:
+            return next(iter(lst))
+        return None
+
+    def has(self, obj, action):
+        return (obj, action) in self._by_action
+
+    def remove_all(self, obj):
+        """ remove every animation of this object """
+        for animation in list(self._by_obj.get(obj, ())):
+            self.remove(animation)
+
+    def clear(self):
+        self._all.clear()
+        self._by_obj.clear()
+        self._by_action.clear()
+        if self.animator is not None:
+            self.animator.clear()
@@ -0,0 +1,117 @@
+import numpy
+from .constants import *
+
+class ArrayAnimator:
+    """
+        an animation backend that keeps the state of every running tween in numpy
+        arrays (one row per animated attribute) and interpolates all of them in a
+        single vectorized step. `Animation` objects are still the handles used by
+        the rest of the engine, this class only replaces `Animation.update()`.
+    """
+    def __init__(self, capacity = 256):
+        self.count = 0
+        self.dead = 0
+        self.start = numpy.zeros(capacity)
+        self.target = numpy.zeros(capacity)
+        self.elapsed = numpy.zeros(capacity)
+        self.duration = numpy.ones(capacity)
+        self.extra = numpy.zeros(capacity)
+        self.anims = [None] * capacity
+        self.attrs = [None] * capacity
+        self.rows = {}
+
+    def _grow(self):
+        capacity = len(self.anims) * 2
+        for name in ('start', 'target', 'elapsed', 'duration', 'extra'):
+            old = getattr(self, name)
+            new = numpy.ones(capacity) if name == 'duration' else numpy.zeros(capacity)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.anims.extend([None] * (capacity - len(self.anims)))
+        self.attrs.extend([None] * (capacity - len(self.attrs)))
+
+    def add(self, animation):
+        """ add a row for each attribute of a new animation. animations without
+            attributes (timers) get a single row that is never written back """
+        rows = []
+        extra = 0.0
+        if animation.action == GRAVITY:
+            extra = animation.acceleration * animation.obj._mass
+        for attribute in (list(animation.attributes) or [None]):
+            if self.count == len(self.anims):
+                self._grow()
+            row = self.count
+            if attribute is None:
+                self.start[row] = self.target[row] = 0.0
+            else:
+                self.start[row] = animation.start[attribute]
+                self.target[row] = animation.attributes[attribute]
+            self.elapsed[row] = animation.time
+            self.duration[row] = animation.duration
+            self.extra[row] = extra
+            self.anims[row] = animation
+            self.attrs[row] = attribute
+            rows.append(row)
+            self.count += 1
+        self.rows[animation] = rows
+
+    def remove(self, animation):
+        """ drop the rows of an animation. rows are only marked as dead here, they
+            are packed (keeping their order) once enough of them pile up """
+        rows = self.rows.pop(animation, None)
+        if rows is None:
+            return
+        for row in rows:
+            self.anims[row] = None
+            self.attrs[row] = None
+        self.dead += len(rows)
+        if self.dead > 64 and self.dead * 2 > self.count:
+            self._compact()
+
+    def _compact(self):
+        count = self.count
+        alive = [row for row in range(count) if self.anims[row] is not None]
+        for name in ('start', 'target', 'elapsed', 'duration', 'extra'):
+            arr = getattr(self, name)
+            arr[:len(alive)] = arr[alive]
+        anims = [self.anims[row] for row in alive]
+        attrs = [self.attrs[row] for row in alive]
+        self.anims[:count] = anims + [None] * (count - len(alive))
+        self.attrs[:count] = attrs + [None] * (count - len(alive))
+        self.count = len(alive)
+        self.dead = 0
+        self.rows = {}
+        for row, animation in enumerate(anims):
+            if animation not in self.rows:
+                self.rows[animation] = []
+            self.rows[animation].append(row)
+
+    def clear(self):
+        self.anims[:self.count] = [None] * self.count
+        self.attrs[:self.count] = [None] * self.count
+        self.count = 0
+        self.dead = 0
+        self.rows = {}
+
+    def update(self, delta):
+        """ advance every animation by `delta` milliseconds """
+        count = self.count
+        if count == 0:
+            return
+
+        elapsed = self.elapsed[:count]
+        elapsed += delta / 1000 + self.extra[:count]
+        progress = numpy.minimum(elapsed / self.duration[:count], 1.0)
+        start = self.start[:count]
+        # same operation order as Animation.update so results match exactly
+        values = (progress * (self.target[:count] - start) + start).tolist()
+
+        anims = self.anims
+        attrs = self.attrs
+        for row in range(count):
+            if attrs[row] is not None:
+                setattr(anims[row].obj, attrs[row], values[row])
+
+        for row in numpy.flatnonzero(progress >= 1.0).tolist():
+            if anims[row] is not None:
+                anims[row].finished = True
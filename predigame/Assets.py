@@ -0,0 +1,64 @@
+import os
+
+# directories (relative to the game) that hold game assets
+DIRECTORIES = ('images', 'actors', 'backgrounds', 'sounds', 'mazes')
+
+class Assets:
+    """
+        an index of the files in the asset directories. directories are only listed
+        when the index is built (or refreshed), looking up an asset by name is a
+        dictionary lookup. names are matched without case and without the extension,
+        so `coin` finds `images/Coin.png` (and so does `coin.png`). paths are relative to the game directory.
+    """
+    def __init__(self):
+        self.refresh()
+
+    def refresh(self):
+        """ list the asset directories again. call after adding or removing files """
+        self.files = {}
+        self.names = {}
+        for kind in DIRECTORIES:
+            files = os.listdir(kind) if os.path.isdir(kind) else None
+            self.files[kind] = files
+            names = {}
+            for file in files or []:
+                # `a.b.png` can be found as `a`, `a.b` or `a.b.png`
+                idx = file.find('.')
+                while idx > 0:
+                    names.setdefault(file[:idx].lower(), []).append(file)
+                    idx = file.find('.', idx + 1)
+                names.setdefault(file.lower(), []).append(file)
+            self.names[kind] = names
+
+    def exists(self, kind):
+        """ true if the game has a directory for this kind of asset """
+        return self.files.get(kind) is not None
+
+    def list(self, kind):
+        """ every file in an asset directory (empty if the directory is missing) """
+        return self.files.get(kind) or []
+
+    def find(self, kind, name):
+        """ the paths of all files matching `name`, best match first """
+        return [os.path.join(kind, file) for file in self.names.get(kind, {}).get(name.lower(), [])]
+
+    def names_of(self, kind):
+        """ the (lower case) names that find each file first, by file """
+        files = {}
+        for name, matches in self.names.get(kind, {}).items():
+            files.setdefault(matches[0], []).append(name)
+        return files
+
+    def path(self, kind, name, extensions = None):
+        """
+            the path of the file matching `name` or `None`. if `extensions` are given
+            (in order of preference) the file has to be exactly `name.extension`.
+        """
+        files = self.names.get(kind, {}).get(name.lower(), [])
+        if extensions is None:
+            return os.path.join(kind, files[0]) if files else None
+        for ext in extensions:
+            for file in files:
+                if file.lower() == (name + '.' + ext).lower():
+                    return os.path.join(kind, file)
+        return None
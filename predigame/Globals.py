@@ -1,8 +1,13 @@
+from .SurfaceCache import SurfaceCache
+
 class Globals:
     instance = None
     MAX_SIZE=35
+    MAX_SPRITES=50000
     cache = {}
+    transforms = SurfaceCache()
     def __init__(self, width, height, grid_size, collisions):
+        from .Animation import Animations
         self.WIDTH = width
         self.HEIGHT = height
         self.GRID_SIZE = grid_size
@@ -14,7 +19,9 @@ class Globals:
         self.backgrounds = [] #sprites/scene things that are in the background
         self.cells = {}
         self.tags = {}
-        self.animations = []
+        # tag -> [(other tag, order, callback)] collision rules between tag groups
+        self.tag_collisions = {}
+        self.animations = Animations()
         self.keys_registered = {
             'keydown': {},
             'keyup': {}
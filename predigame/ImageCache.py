@@ -0,0 +1,62 @@
+import os, struct, hashlib, pygame
+
+# images wider or taller than this are shrunk when loaded
+MAX_WIDTH = 250
+HEADER = struct.Struct('<II')
+
+def cache_dir():
+    """ where shrunk images are kept. can be changed with the PREDIGAME_CACHE environment variable """
+    return os.environ.get('PREDIGAME_CACHE', os.path.join(os.path.expanduser('~'), '.predigame', 'cache'))
+
+class ImageCache:
+    """
+        loads images, shrinking large ones to `MAX_WIDTH` pixels wide. shrunk images are
+        saved (as raw RGBA pixels) in a cache directory, keyed on the image's path, size
+        and modification time, so later runs load them without decoding the original.
+        the original files are never changed.
+    """
+    def __init__(self, directory = None, width = MAX_WIDTH):
+        self.directory = directory or cache_dir()
+        self.width = width
+
+    def _entry(self, path):
+        stat = os.stat(path)
+        key = '{}|{}|{}|{}'.format(os.path.realpath(path), stat.st_size, stat.st_mtime_ns, self.width)
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.rgba')
+
+    def load(self, path):
+        """ load an image file as a pygame surface """
+        entry = self._entry(path)
+        try:
+            with open(entry, 'rb') as f:
+                width, height = HEADER.unpack(f.read(HEADER.size))
+                return pygame.image.fromstring(f.read(), (width, height), 'RGBA')
+        except (OSError, ValueError, struct.error):
+            pass
+
+        from PIL import Image
+        img = Image.open(path)
+        # only the header has been read so far
+        if img.size[0] <= self.width and img.size[1] <= self.width:
+            return pygame.image.load(path)
+
+        print('checking image (' + path + ') size --> ' + str(img.size))
+        height = int(img.size[1] * (self.width / float(img.size[0])))
+        # let the jpeg decoder skip detail we are about to throw away
+        img.draft('RGB', (self.width, height))
+        img = img.convert('RGBA').resize((self.width, height), Image.LANCZOS)
+        data = img.tobytes()
+        self._save(entry, img.size, data)
+        return pygame.image.fromstring(data, img.size, 'RGBA')
+
+    def _save(self, entry, size, data):
+        try:
+            os.makedirs(self.directory, exist_ok = True)
+            tmp = entry + '.' + str(os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(HEADER.pack(*size))
+                f.write(data)
+            os.replace(tmp, entry)
+        except OSError:
+            # caching is only an optimization
+            pass
@@ -0,0 +1,112 @@
+import os, json, mmap, struct, pygame
+from . import pga
+from .Assets import Assets
+from .ImageCache import ImageCache
+
+MAGIC = b'PGPK'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+# file name of a game's pack (in the game directory)
+PACK_FILE = 'assets.pack'
+
+def _stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def build(output, width, height):
+    """
+        compile the images, actors and backgrounds of the game in the current directory
+        into a single pack file. images are shrunk the same way they are when loaded and
+        backgrounds are scaled to the `width` x `height` window. returns the number of
+        packed files.
+    """
+    assets = Assets()
+    index = {}
+    chunks = []
+    offset = 0
+
+    def add(surface):
+        nonlocal offset
+        raw = pga.rgba(surface)
+        entry = [surface.get_width(), surface.get_height(), offset]
+        chunks.append(raw)
+        offset += len(raw)
+        return entry
+
+    loader = ImageCache()
+    for file in assets.list('images'):
+        path = os.path.join('images', file)
+        try:
+            index[path] = {'stamp': _stamp(path), 'image': add(loader.load(path))}
+        except Exception as e:
+            print('Skipping ' + path + ': ' + str(e))
+
+    for file in assets.list('backgrounds'):
+        path = os.path.join('backgrounds', file)
+        try:
+            surface = pygame.transform.scale(pygame.image.load(path), (width, height))
+            index[path] = {'stamp': _stamp(path), 'image': add(surface)}
+        except Exception as e:
+            print('Skipping ' + path + ': ' + str(e))
+
+    for file in assets.list('actors'):
+        path = os.path.join('actors', file)
+        try:
+            states = pga.load(path, cache = False)
+            index[path] = {'stamp': _stamp(path), 'states': [[state, [add(f) for f in frames]] for state, frames in states.items()]}
+        except Exception as e:
+            print('Skipping ' + path + ': ' + str(e))
+
+    header = json.dumps(index).encode('utf-8')
+    tmp = output + '.' + str(os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, output)
+    return len(index)
+
+class Pack:
+    """
+        reads a pack file written by `build()`. the file is memory mapped and surfaces
+        are created straight from the mapped pixels, without decoding any images.
+        entries are ignored when the original file has changed since it was packed.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_COPY)
+        magic, version, length = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Unsupported pack file: ' + path)
+        self.index = json.loads(self.data[HEADER.size:HEADER.size + length].decode('utf-8'))
+        self.base = HEADER.size + length
+
+    def _entry(self, path):
+        entry = self.index.get(os.path.normpath(path))
+        if entry is None:
+            return None
+        try:
+            if _stamp(path) != entry['stamp']:
+                return None
+        except OSError:
+            pass
+        return entry
+
+    def _surface(self, width, height, offset):
+        start = self.base + offset
+        return pygame.image.frombuffer(memoryview(self.data)[start:start + width * height * 4], (width, height), 'RGBA')
+
+    def image(self, path):
+        """ the packed image (or background) for a file or `None` """
+        entry = self._entry(path)
+        if entry is None or 'image' not in entry:
+            return None
+        return self._surface(*entry['image'])
+
+    def actor(self, path):
+        """ the packed states of an actor archive or `None` """
+        entry = self._entry(path)
+        if entry is None or 'states' not in entry:
+            return None
+        return {state: [self._surface(*frame) for frame in frames] for state, frames in entry['states']}
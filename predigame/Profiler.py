@@ -0,0 +1,57 @@
+from time import perf_counter
+from collections import deque
+
+# the phases of a frame, in the order they run
+PHASES = ('events', 'update', 'collisions', 'animations', 'callbacks', 'level', 'draw', 'display')
+
+class Profiler:
+    """
+        records how long each phase of a frame takes (in milliseconds) and keeps a
+        rolling window of recent frames for computing averages and percentiles.
+    """
+    def __init__(self, window = 240):
+        self.frames = deque(maxlen=window)
+        self.current = None
+        self.frame_start = None
+
+    def begin(self):
+        """ start timing a new frame """
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.frame_start = perf_counter()
+
+    def add(self, phase, start):
+        """ add the time since `start` (a `perf_counter()` value) to a phase """
+        if self.current is not None:
+            self.current[phase] += (perf_counter() - start) * 1000.0
+
+    def end(self):
+        """ finish timing the current frame """
+        if self.current is None:
+            return
+        self.current['frame'] = (perf_counter() - self.frame_start) * 1000.0
+        self.frames.append(self.current)
+        self.current = None
+
+    def stats(self):
+        """
+            summarize the recorded frames. returns a dictionary with an entry per phase
+            (and `frame` for the whole frame), each holding the `avg`, `p95`, `p99`
+            and `max` time in milliseconds.
+        """
+        summary = {}
+        if len(self.frames) == 0:
+            return summary
+        for phase in PHASES + ('frame',):
+            values = sorted(frame[phase] for frame in self.frames)
+            count = len(values)
+            summary[phase] = {
+                'avg': sum(values) / count,
+                'p95': values[min(count - 1, int(count * 0.95))],
+                'p99': values[min(count - 1, int(count * 0.99))],
+                'max': values[-1]
+            }
+        return summary
+
+    def reset(self):
+        self.frames.clear()
+        self.current = None
@@ -0,0 +1,60 @@
+import gzip, json, pygame
+from pygame.locals import *
+
+# the only events the main loop acts on
+RECORDED_EVENTS = (QUIT, KEYDOWN, KEYUP, MOUSEBUTTONDOWN, USEREVENT)
+VERSION = 1
+
+def _encode(event):
+    attributes = {}
+    for key, value in event.dict.items():
+        if isinstance(value, tuple):
+            value = list(value)
+        if value is None or isinstance(value, (int, float, str, list)):
+            attributes[key] = value
+    return [event.type, attributes]
+
+def _decode(data):
+    event_type, attributes = data
+    for key, value in attributes.items():
+        if isinstance(value, list):
+            attributes[key] = tuple(value)
+    return pygame.event.Event(event_type, attributes)
+
+class Recorder:
+    """
+        writes a compact (gzipped, one line per frame) log of everything that drives a
+        game: the random seed, and for each frame the elapsed time, the mouse position
+        and the events consumed by the main loop.
+    """
+    def __init__(self, path, seed, **info):
+        self.file = gzip.open(path, 'wt')
+        header = {'version': VERSION, 'seed': seed}
+        header.update(info)
+        self.file.write(json.dumps(header) + '\n')
+
+    def frame(self, delta, mouse, events):
+        events = [_encode(e) for e in events if e.type in RECORDED_EVENTS]
+        self.file.write(json.dumps([delta, list(mouse), events], separators=(',', ':')) + '\n')
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+class Replayer:
+    """ reads a log written by `Recorder` back one frame at a time """
+    def __init__(self, path):
+        self.file = gzip.open(path, 'rt')
+        self.header = json.loads(self.file.readline())
+        if self.header.get('version') != VERSION:
+            raise ValueError('Unsupported recording version: ' + str(self.header.get('version')))
+        self.seed = self.header['seed']
+
+    def next(self):
+        """ returns the (delta, mouse, events) of the next frame or None at the end """
+        line = self.file.readline()
+        if not line:
+            self.file.close()
+            return None
+        delta, mouse, events = json.loads(line)
+        return delta, tuple(mouse), [_decode(e) for e in events]
@@ -0,0 +1,103 @@
+import heapq
+from .constants import *
+
+class Timer:
+    """
+        a handle to a scheduled callback. the same handle is reused each time a
+        repeating callback is rescheduled.
+    """
+    def __init__(self, scheduler, callback, wait, repeat):
+        self.scheduler = scheduler
+        self.callback = callback
+        self.wait = wait
+        self.repeat = repeat
+        self.time = 0
+        self.seq = 0
+        self.pending = False
+        self.cancelled = False
+
+    def __lt__(self, other):
+        # ties are broken by scheduling order
+        if self.time == other.time:
+            return self.seq < other.seq
+        return self.time < other.time
+
+    def cancel(self):
+        """ stop this callback from running (again) """
+        if self.cancelled:
+            return
+        self.cancelled = True
+        if self.pending:
+            self.scheduler._cancelled += 1
+
+class Scheduler:
+    """
+        a priority queue of time based callbacks. only callbacks that are due are
+        looked at, cancelled callbacks are dropped lazily.
+    """
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+        self._cancelled = 0
+        # bumped by `clear()`, so callbacks already taken off the queue are dropped too
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def schedule(self, callback, time, wait, repeat=0):
+        """ schedule `callback` to run at `time`. returns a `Timer` handle """
+        timer = Timer(self, callback, wait, repeat)
+        self._push(timer, time)
+        return timer
+
+    def _push(self, timer, time):
+        timer.time = time
+        timer.seq = self._seq
+        timer.pending = True
+        self._seq += 1
+        heapq.heappush(self._heap, timer)
+
+    def run(self, now):
+        """ invoke every callback that is due at time `now` """
+        heap = self._heap
+        due = []
+        while heap and heap[0].time <= now:
+            timer = heapq.heappop(heap)
+            timer.pending = False
+            if timer.cancelled:
+                self._cancelled -= 1
+            else:
+                due.append(timer)
+
+        # callbacks scheduled while running wait until the next call
+        generation = self._generation
+        for timer in due:
+            if timer.cancelled or self._generation != generation:
+                continue
+            timer.callback()
+            if timer.cancelled or self._generation != generation:
+                continue
+            if timer.repeat > 1:
+                timer.repeat -= 1
+                self._push(timer, now + timer.wait)
+            elif timer.repeat == FOREVER:
+                self._push(timer, now + timer.wait)
+
+        self._compact()
+
+    def _compact(self):
+        """ drop cancelled callbacks once they make up most of the queue """
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._heap = [timer for timer in self._heap if not timer.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def clear(self):
+        """ remove all scheduled callbacks, including any that are due but haven't run yet """
+        for timer in self._heap:
+            timer.pending = False
+            timer.cancelled = True
+        self._heap = []
+        self._cancelled = 0
+        self._generation += 1
@@ -1,11 +1,29 @@
 import sys, random, math, pygame
 from functools import partial
-from .utils import register_keydown, register_keyup, animate, randrange_float, sign, to_grid, is_wall, to_area, at, has_animation, get_animation, vsub, max_distance, has_obstacle
+from .utils import register_keydown, register_keyup, register_cell, unregister_cell, animate, randrange_float, sign, to_grid, is_wall, to_area, at, has_animation, get_animation, vsub, max_distance, has_obstacle
 from .Globals import Globals
 from .constants import *
 import time
-import copy
-
+from itertools import count
+
+# shared by sprites that never register collisions or clicks
+NONE = ()
+# sprites with more collision targets than this only test the targets nearby
+BROAD_PHASE = 8
+# keeps collision callbacks in the order they were registered
+_collision_seq = count()
+# creation order of sprites, used to keep collision callbacks in a stable order
+_sprite_serial = count()
+
+def _handler(callback, on_enter, on_stay, on_exit):
+    """ what a collision rule calls: a callback for every frame of contact or an (on_enter, on_stay, on_exit) tuple """
+    if on_enter is None and on_stay is None and on_exit is None:
+        if callback is None:
+            sys.exit('ERROR: a collision needs a callback')
+        return callback
+    if callback is not None:
+        sys.exit('ERROR: a collision can have a callback or on_enter/on_stay/on_exit, not both')
+    return (on_enter, on_stay, on_exit)
 
 class Sprite():
     """
@@ -15,16 +33,40 @@ class Sprite():
     have some fun properties - they can be clicked, collide with other sprites, even fade, spin or pulse.
 
     """
-    def __init__(self, surface, rect, tag=None, abortable=False, name=None):
-        if len(Globals.instance.sprites) >= 9000:
-            sys.exit('Too many sprites! You\'re trying to spawn over 9,000!')
-        self.surface = surface.convert_alpha()
-        self.origin_surface = self.surface
+    # fixed attributes are kept in slots to keep sprites small. `__dict__` is still
+    # available for anything a game wants to attach to a sprite.
+    __slots__ = ('_serial', '_cells', '_cell_key', 'surface', 'origin_surface', 'rect', 'virt_rect', 'prev_rect',
+                 '_mask', '_mask_surface', 'needs_move', 'needs_scale', 'needs_rotation', 'move_speed', 'moving',
+                 'float_vec', 'bounce_vec', 'sprite_scale_x', 'sprite_scale_y', 'rotate_angle', 'collisions', '_collision_limit', '_tag_collisions', '_contacts', 'register_collisions',
+                 'clicks', 'lifespan', '_pixelated', '_dirty', '_value', 'event_pos', 'name', '_tag',
+                 'abortable', '_mass', 'falling', '__dict__', '__weakref__')
+
+    def __init__(self, surface, rect, tag=None, abortable=False, name=None, cache=True):
+        if len(Globals.instance.sprites) >= Globals.MAX_SPRITES:
+            sys.exit('Too many sprites! You\'re trying to spawn over {:,}!'.format(Globals.MAX_SPRITES))
+        self._serial = next(_sprite_serial)
+        self._cells = None
+        self._cell_key = None
         self.rect = rect
         self.virt_rect = [float(self.rect.x), float(self.rect.y), float(self.rect.width), float(self.rect.height)]
-        self.prev_rect = self.virt_rect
-        self.surface = pygame.transform.scale(self.origin_surface, rect.size)
-        self.mask = pygame.mask.from_surface(self.surface)
+        self.prev_rect = list(self.virt_rect)
+        if cache:
+            self.origin_surface = Globals.transforms.convert(surface)
+            self.surface = Globals.transforms.scale(self.origin_surface, rect.size)
+        else:
+            # one off surfaces (like text) would only crowd reusable ones out of the cache
+            self.origin_surface = surface.convert_alpha()
+            if self.origin_surface.get_size() == rect.size:
+                self.surface = self.origin_surface
+            else:
+                self.surface = pygame.transform.scale(self.origin_surface, rect.size)
+        # the collision mask is only built when a pixel collision check needs it
+        self._mask = None
+        self._mask_surface = None
+        # what changed since the last frame. only scale and angle changes
+        # require transforming the surface again.
+        self.needs_move = False
+        self.needs_scale = False
         self.needs_rotation = False
         self.move_speed = 5
         self.moving = False
@@ -33,11 +75,15 @@ class Sprite():
         self.sprite_scale_x = self.width
         self.sprite_scale_y = self.height
         self.rotate_angle = 0
-        self.collisions = []
+        self.collisions = NONE
+        self._collision_limit = 16
+        self._tag_collisions = NONE
+        self._contacts = NONE
         self.register_collisions = None
-        self.clicks = []
+        self.clicks = NONE
         self.lifespan = -1
         self._pixelated = 0
+        self._dirty = False
         self._value = 0
         self.event_pos = None
         self.name = name
@@ -46,15 +92,25 @@ class Sprite():
         self._mass = 0
         self.falling = False
 
-        if tag not in Globals.instance.tags.keys():
-            Globals.instance.tags[tag] = [self]
-        else:
-            Globals.instance.tags[tag].append(self)
+        # each tag group is a dict used as an ordered set
+        if tag not in Globals.instance.tags:
+            Globals.instance.tags[tag] = {}
+        Globals.instance.tags[tag][self] = None
 
         for rc in Globals.instance.register_collisions:
             if rc.register_collisions[0](self):
                 rc.collides(self, rc.register_collisions[1])
 
+        register_cell(self.pos, self)
+
+    @property
+    def mask(self):
+        """ the collision mask of the current surface """
+        if self._mask is None or self._mask_surface is not self.surface:
+            self._mask = Globals.transforms.mask(self.surface)
+            self._mask_surface = self.surface
+        return self._mask
+
     @property
     def pixelated(self):
         return self._pixelated
@@ -93,8 +149,9 @@ class Sprite():
         """
             set the x (left/right) position of the sprite
         """
-        self.needs_rotation = True
+        self.needs_move = True
         self.virt_rect[0] = int(float(value) * Globals.instance.GRID_SIZE)
+        self._reindex()
 
     @property
     def y(self):
@@ -110,8 +167,9 @@ class Sprite():
         """
             set the y (up/down) position of the sprite
         """
-        self.needs_rotation = True
+        self.needs_move = True
         self.virt_rect[1] = int(float(value) * Globals.instance.GRID_SIZE)
+        self._reindex()
 
     @property
     def pos(self):
@@ -133,8 +191,10 @@ class Sprite():
 
             :return: a position tuple (x, y)
         """
-        self.x = value[0]
-        self.y = value[1]
+        self.needs_move = True
+        self.virt_rect[0] = int(float(value[0]) * Globals.instance.GRID_SIZE)
+        self.virt_rect[1] = int(float(value[1]) * Globals.instance.GRID_SIZE)
+        self._reindex()
 
     @property
     def width(self):
@@ -170,7 +230,7 @@ class Sprite():
 
             :todo: this method applies the same magnification to both x and y dimensions. sprites should maintain separate sizes, one for each dimension.
         """
-        self.needs_rotation = True
+        self.needs_scale = True
         self.sprite_scale_x = value
         self.sprite_scale_y = value
 
@@ -215,6 +275,13 @@ class Sprite():
             many zombie sprites can all have the singular tag "zombie".
             (can be None if no tag provided)
         """
+        tags = Globals.instance.tags
+        group = tags.get(self._tag)
+        if group is not None and self in group:
+            del group[self]
+            if value not in tags:
+                tags[value] = {}
+            tags[value][self] = None
         self._tag = value
 
 
@@ -223,40 +290,129 @@ class Sprite():
         x, y, width, height = self.virt_rect[:]
         return (x + width/2.0)/ Globals.instance.GRID_SIZE, (y + height/2.0)/ Globals.instance.GRID_SIZE
 
+    def _reindex(self):
+        """ keep the cell index in sync. only touches the index when the covered cells change """
+        if self._cells is not None:
+            register_cell(self.pos, self)
+
     def stop(self):
         """ stop any running animations involving this sprite """
-        for o in Globals.instance.animations:
-            if o.obj == self:
-                Globals.instance.animations.remove(o)
+        Globals.instance.animations.remove_all(self)
         return self
 
     def _update(self, delta):
         if self._mass > 0:
             self._update_gravity()
-        if self.needs_rotation:
+        if self.needs_scale or self.needs_rotation:
             self.rotate(0)
-            self.needs_rotation = False
-        self._handle_collisions()
-        self.prev_rect = copy.copy(self.virt_rect)
+        elif self.needs_move:
+            self._place()
+        self.needs_move = self.needs_scale = self.needs_rotation = False
+        self.prev_rect[:] = self.virt_rect
+
+    def _place(self):
+        """ move the drawn rect to the current position, keeping the current surface """
+        x, y, width, height = self.virt_rect
+        self.rect = self.surface.get_rect(center=((x + width/2), (y + height/2)))
+        self.virt_rect[2] = self.rect[2]
+        self.virt_rect[3] = self.rect[3]
+        self._reindex()
 
     def _draw(self, surface):
         surface.blit(self.surface, self.rect)
 
+    def _nearby(self):
+        """ sprites in the cells around this sprite. the area is one cell larger on
+            every side since sprites between cells are indexed by their top left cell """
+        cells = Globals.instance.cells
+        x, y = self.x, self.y
+        found = set()
+        for i in range(x - 1, x + int(math.ceil(self.width)) + 1):
+            for j in range(y - 1, y + int(math.ceil(self.height)) + 1):
+                lst = cells.get((i, j))
+                if lst:
+                    found.update(lst)
+        return found
+
     def _handle_collisions(self):
-        for collision in self.collisions:
-            if not collision['sprite'] in Globals.instance.sprites:
-                self.collisions.remove(collision)
+        pending = []
+        nearby = None
+        collisions = self.collisions
+        if collisions:
+            if len(collisions) > self._collision_limit:
+                # forget sprites that were destroyed
+                for sprite in [s for s in collisions if s._cells is None]:
+                    del collisions[sprite]
+                self._collision_limit = max(16, 2 * len(collisions))
+
+            # broad phase: only sprites close enough to touch are tested
+            if len(collisions) <= BROAD_PHASE:
+                candidates = list(collisions)
+            else:
+                nearby = self._nearby()
+                candidates = nearby
+
+            for sprite in candidates:
+                callbacks = collisions.get(sprite)
+                if callbacks is None:
+                    continue
+                if sprite._cells is None:
+                    del collisions[sprite]
+                    continue
+                for seq, callback in callbacks:
+                    pending.append((seq, sprite._serial, sprite, callback))
+
+        tags = Globals.instance.tags
+        for rules in (self._tag_collisions, Globals.instance.tag_collisions.get(self._tag, NONE)):
+            for tag, seq, callback in rules:
+                group = tags.get(tag)
+                if not group:
+                    continue
+                if len(group) <= BROAD_PHASE:
+                    members = group
+                else:
+                    if nearby is None:
+                        nearby = self._nearby()
+                    members = [s for s in nearby if s._tag == tag]
+                for sprite in members:
+                    if sprite is not self:
+                        pending.append((seq, sprite._serial, sprite, callback))
+
+        pending.sort(key=lambda p: (p[0], p[1]))
+        contacts = self._contacts
+        touching = None
+        for seq, serial, sprite, callback in pending:
+            # may have been destroyed by an earlier callback
+            if sprite._cells is None:
+                continue
+            if not self.rect.colliderect(sprite.rect):
                 continue
-
             if Globals.instance.PIXEL_COLLISIONS:
-                offset = list(map(int,vsub(collision['sprite'].rect, self.rect)))
-                overlap = self.mask.overlap_area(collision['sprite'].mask,offset)
-                if overlap > 0:
-                    collision['cb'](self, collision['sprite'])
-            else:
-                if self.rect.colliderect(collision['sprite'].rect):
-                    collision['cb'](self, collision['sprite'])
-                #break # only handle one collision per frame (for now)
+                offset = list(map(int,vsub(sprite.rect, self.rect)))
+                if self.mask.overlap_area(sprite.mask, offset) == 0:
+                    continue
+            if type(callback) is not tuple:
+                callback(self, sprite)
+                continue
+
+            # contact rules remember which sprites they touched last frame
+            key = (seq, sprite)
+            if touching is None:
+                touching = {}
+            touching[key] = callback
+            on_enter, on_stay, on_exit = callback
+            if key not in contacts:
+                if on_enter is not None:
+                    on_enter(self, sprite)
+            elif on_stay is not None:
+                on_stay(self, sprite)
+
+        if contacts or touching:
+            self._contacts = touching or NONE
+        if contacts:
+            for key, (on_enter, on_stay, on_exit) in contacts.items():
+                if on_exit is not None and (touching is None or key not in touching):
+                    on_exit(self, key[1])
 
     def _update_float(self, distance, time):
         float_x, float_y = self.float_vec
@@ -582,33 +738,62 @@ class Sprite():
         return self
 
 
-    def collides(self, sprites, callback):
+    def collides(self, sprites, callback = None, on_enter = None, on_stay = None, on_exit = None):
         """
             register a callback function for when this sprite collides with another sprite. collision checks will occur as part of each update invocation.
 
             :param sprites: one (single object) or more (a list) of sprites to check for collisions. can be a function to evaluate and add future sprites for addition
 
-            :param callback: the callback function to invoke when a collision is detected.
+            :param callback: the callback function to invoke when a collision is detected. called on every update while the sprites overlap.
+
+            :param on_enter: instead of `callback`, a function to invoke once when the sprites start to overlap.
+
+            :param on_stay: a function to invoke on every later update while the sprites still overlap.
+
+            :param on_exit: a function to invoke once when the sprites stop overlapping (or the other sprite is destroyed).
 
             :todo: confirm that collides are bi-directional events.
 
         """
+        callback = _handler(callback, on_enter, on_stay, on_exit)
         if callable(sprites):
             self.register_collisions = (sprites, callback)
             Globals.instance.register_collisions.append(self)
+            return self
 
         if not isinstance(sprites, list):
             sprites = [sprites]
 
+        if self.collisions is NONE:
+            self.collisions = {}
         for sprite in sprites:
             if sprite == self:
                 continue
-            if sprite in self.collisions:
-                self.collisions.remove(sprite)
-            self.collisions.append({ 'sprite': sprite, 'cb': callback })
+            if sprite not in self.collisions:
+                self.collisions[sprite] = []
+            self.collisions[sprite].append((next(_collision_seq), callback))
 
         return self
 
+    def collides_tag(self, tag, callback = None, on_enter = None, on_stay = None, on_exit = None):
+        """
+            register a callback function for when this sprite collides with any sprite with a given tag,
+            including sprites created later. cheaper than `Sprite.collides()` with a function when
+            many sprites are created and destroyed.
+
+            :param tag: the tag of the sprites to check for collisions.
+
+            :param callback: the callback function to invoke when a collision is detected.
+
+            :param on_enter, on_stay, on_exit: contact callbacks, as for `Sprite.collides()`.
+
+        """
+        callback = _handler(callback, on_enter, on_stay, on_exit)
+        if self._tag_collisions is NONE:
+            self._tag_collisions = []
+        self._tag_collisions.append((tag, next(_collision_seq), callback))
+        return self
+
     def clicked(self, callback, button = 1):
         """
             register a callback function for when this sprite is clicked with a mouse button.
@@ -620,6 +805,8 @@ class Sprite():
             :todo: confirm that collides are bi-directional events.
 
         """
+        if self.clicks is NONE:
+            self.clicks = []
         self.clicks.append({'btn': button, 'cb': callback})
 
         return self
@@ -631,6 +818,12 @@ class Sprite():
             :param pixel_size: the size of the pixels. default is `10`.
         """
 
+        # cached surfaces are shared with other sprites, draw on a copy
+        if self.surface is self.origin_surface:
+            self.surface = self.surface.copy()
+        else:
+            self.surface = Globals.transforms.owned(self.surface)
+
         x_start = 0
         x_range = int(self.virt_rect[2])
         y_start = 0
@@ -640,6 +833,8 @@ class Sprite():
             for y_offset in range(y_start, y_range, pixel_size):
                 avg_color = pygame.transform.average_color(self.surface, (x_offset, y_offset, pixel_size, pixel_size))
                 pygame.draw.rect(self.surface, avg_color, (x_offset, y_offset, pixel_size, pixel_size))
+        self._dirty = True
+        self._mask = None
 
         return self
 
@@ -659,13 +854,13 @@ class Sprite():
 
         scale_width = self.sprite_scale_x * Globals.instance.GRID_SIZE
         scale_height = self.sprite_scale_y * Globals.instance.GRID_SIZE
-        self.surface = pygame.transform.scale(self.origin_surface, (int(scale_width), int(scale_height)))
-        self.surface = pygame.transform.rotate(self.surface, self.rotate_angle)
+        self.surface = Globals.transforms.rotate(self.origin_surface, (scale_width, scale_height), self.rotate_angle)
 
         self.rect = self.surface.get_rect(center=center)
         new_rect = self.surface.get_rect()
         self.virt_rect[2] = new_rect[2]
         self.virt_rect[3] = new_rect[3]
+        self._reindex()
 
         return self
 
@@ -679,8 +874,8 @@ class Sprite():
 
         """
 
-        self.origin_surface = pygame.transform.flip(self.origin_surface, flip_x, flip_y)
-        self.surface = pygame.transform.flip(self.surface, flip_x, flip_y)
+        self.origin_surface = Globals.transforms.flip(self.origin_surface, flip_x, flip_y)
+        self.surface = Globals.transforms.flip(self.surface, flip_x, flip_y)
 
         return self
 
@@ -703,7 +898,8 @@ class Sprite():
         self.sprite_scale_x = self.sprite_scale_x * size
         self.sprite_scale_y = self.sprite_scale_y * size
 
-        self.surface = pygame.transform.smoothscale(self.origin_surface, (int(self.virt_rect[2]), int(self.virt_rect[3]))).convert_alpha()
+        self.surface = Globals.transforms.scale(self.origin_surface, (self.virt_rect[2], self.virt_rect[3]), smooth = True)
+        self._reindex()
 
         return self
 
@@ -781,8 +977,10 @@ class Sprite():
         """
         if self in Globals.instance.sprites:
            Globals.instance.sprites.remove(self)
-        if self in Globals.instance.tags[self._tag]:
-           Globals.instance.tags[self._tag].remove(self)
+        unregister_cell(self)
+        group = Globals.instance.tags.get(self._tag)
+        if group is not None and self in group:
+           del group[self]
         if self in Globals.instance.register_collisions:
            Globals.instance.register_collisions.remove(self)
         return self
@@ -0,0 +1,149 @@
+import pygame, weakref
+from collections import OrderedDict
+
+class SurfaceCache:
+    """
+        a memory bounded (least recently used) cache of converted, scaled, flipped
+        and rotated surfaces, actor frames and their collision masks. sprites that share an image
+        share the transformed copies, so fifty spinning coins only rotate the coin
+        once per angle.
+
+        surfaces handed out by the cache are shared and must not be drawn on. use
+        `SurfaceCache.owned()` to get a private copy first.
+    """
+    # rotations are snapped to this many degrees
+    ANGLE_STEP = 1
+    # upper bound on the memory used by cached pixels (in bytes)
+    LIMIT = 64 * 1024 * 1024
+
+    def __init__(self, limit = None):
+        self.limit = limit or SurfaceCache.LIMIT
+        self.size = 0
+        self.entries = OrderedDict()
+        self.shared = weakref.WeakSet()
+
+    def _get(self, key, source):
+        entry = self.entries.get(key)
+        # the source is kept in the entry so its id can't be reused while cached
+        if entry is None or entry[0] is not source:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key, source, value, size):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[2]
+        self.entries[key] = (source, value, size)
+        self.size += size
+        if isinstance(value, pygame.Surface):
+            self.shared.add(value)
+        while self.size > self.limit and len(self.entries) > 1:
+            k, (s, v, n) = self.entries.popitem(last = False)
+            self.size -= n
+        return value
+
+    @staticmethod
+    def _bytes(surface):
+        w, h = surface.get_size()
+        return w * h * surface.get_bytesize()
+
+    def convert(self, surface):
+        """ the surface converted for fast (alpha) blitting """
+        key = ('convert', id(surface))
+        value = self._get(key, surface)
+        if value is None:
+            value = surface.convert_alpha()
+            # the source is held on to as well
+            self._put(key, surface, value, self._bytes(value) + self._bytes(surface))
+        return value
+
+    def scale(self, surface, size, smooth = False):
+        """ the surface scaled to `size` (a width, height pair of integers) """
+        size = int(size[0]), int(size[1])
+        key = ('scale', id(surface), size, smooth)
+        value = self._get(key, surface)
+        if value is None:
+            if smooth:
+                value = pygame.transform.smoothscale(surface, size).convert_alpha()
+            else:
+                value = pygame.transform.scale(surface, size)
+            self._put(key, surface, value, self._bytes(value))
+        return value
+
+    def flip(self, surface, flip_x, flip_y):
+        """ the surface flipped along the x and/or y axis """
+        key = ('flip', id(surface), bool(flip_x), bool(flip_y))
+        value = self._get(key, surface)
+        if value is None:
+            value = pygame.transform.flip(surface, flip_x, flip_y)
+            self._put(key, surface, value, self._bytes(value))
+        return value
+
+    def rotate(self, surface, size, angle):
+        """ the surface scaled to `size` and then rotated by `angle` degrees """
+        scaled = self.scale(surface, size)
+        angle = round(angle / SurfaceCache.ANGLE_STEP) * SurfaceCache.ANGLE_STEP % 360
+        if angle == 0:
+            return scaled
+        key = ('rotate', id(scaled), angle)
+        value = self._get(key, scaled)
+        if value is None:
+            value = pygame.transform.rotate(scaled, angle)
+            self._put(key, scaled, value, self._bytes(value))
+        return value
+
+    def shape(self, key, draw):
+        """ the surface made by `draw()`, shared by every caller with the same `key` """
+        key = ('shape',) + key
+        value = self._get(key, None)
+        if value is None:
+            value = draw()
+            self._put(key, None, value, self._bytes(value))
+        return value
+
+    def frames(self, actions, size):
+        """
+            the frames of every action of an actor scaled to `size`, shared by every actor
+            with the same actions and size. the frames must not be drawn on.
+        """
+        size = int(size[0]), int(size[1])
+        # the actions are the real key (names can differ in case or be reloaded)
+        key = ('frames', id(actions), size)
+        value = self._get(key, actions)
+        if value is None:
+            value = {}
+            total = 0
+            for action in actions:
+                value[action] = []
+                for img in actions[action]:
+                    img = pygame.transform.scale(img.convert_alpha(), size)
+                    # shared frames get their collision masks cached
+                    self.shared.add(img)
+                    value[action].append(img)
+                    total += self._bytes(img)
+            self._put(key, actions, value, total)
+        return value
+
+    def mask(self, surface):
+        """ the collision mask of a surface. only masks of shared surfaces are cached """
+        if surface not in self.shared:
+            # private surfaces can be drawn on after the mask is made
+            return pygame.mask.from_surface(surface)
+        key = ('mask', id(surface))
+        value = self._get(key, surface)
+        if value is None:
+            value = pygame.mask.from_surface(surface)
+            w, h = surface.get_size()
+            self._put(key, surface, value, w * h // 8)
+        return value
+
+    def owned(self, surface):
+        """ a surface that is safe to draw on: a copy if the surface came from the cache """
+        if surface in self.shared:
+            return surface.copy()
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
@@ -6,6 +6,7 @@ from zipfile import ZipFile
 from types import ModuleType
 from . import predigame
 from .utils import load_module
+from .Globals import Globals
 from predigame.constants import *
 
 from pkg_resources import get_distribution
@@ -16,6 +17,11 @@ def bootstrap():
         print('Predigame Instructional Platform\n')
         print('Running a Game:')
         print('   pred some_file.py\n')
+        print('Running a Game Headless (no window, uncapped frame rate):')
+        print('   pred --headless --frames 500 some_file.py\n')
+        print('Record and Replay a Game Session:')
+        print('   pred --record session.log some_file.py')
+        print('   pred --replay session.log some_file.py\n')
         print('Create a New Game:')
         print('   pred new some_game\n')
         print('List Available Game Downloads:')
@@ -23,6 +29,11 @@ def bootstrap():
         print('Download a Game:')
         print('   pred pull some_game')
         print('   pred fetch some_game\n')
+        print('Pack Game Assets for a Faster Start:')
+        print('   pred pack some_file.py\n')
+        print('Run the Performance Benchmarks:')
+        print('   pred bench --out results.json')
+        print('   pred bench --compare old.json new.json\n')
 
         sys.exit()
     if sys.argv[1] == 'new':
@@ -33,6 +44,11 @@ def bootstrap():
         pull_game()
     elif sys.argv[1] == 'fetch':
         fetch_game()
+    elif sys.argv[1] == 'pack':
+        pack_game()
+    elif sys.argv[1] == 'bench':
+        from .bench import main as bench
+        bench(sys.argv[2:])
     else:
         main()
 
@@ -40,9 +56,34 @@ def err():
     print('Error: Invalid Python file provided')
     sys.exit()
 
+def _option(args, name):
+    """ remove a `--name value` pair from the arguments and return the value """
+    if name not in args:
+        return None
+    idx = args.index(name)
+    if idx + 1 >= len(args):
+        err()
+    value = args[idx + 1]
+    del args[idx:idx + 2]
+    return value
+
 def main():
+    args = sys.argv[1:]
+    headless = '--headless' in args
+    if headless:
+        args.remove('--headless')
+
+    frames = _option(args, '--frames')
+    if frames is not None:
+        try:
+            frames = int(frames)
+        except:
+            err()
+    record = _option(args, '--record')
+    replay = _option(args, '--replay')
+
     try:
-        run_mod = sys.argv[1:][0]
+        run_mod = args[0]
     except:
         err()
 
@@ -64,13 +105,24 @@ def main():
         BACKGROUND = getattr(dummy_mod, 'BACKGROUND', (220, 220, 220))
         FULLSCREEN = getattr(dummy_mod, 'FULLSCREEN', False)
         COLLISIONS = getattr(dummy_mod, 'PIXEL_COLLISIONS', True)
+        TICK_RATE = getattr(dummy_mod, 'TICK_RATE', None)
+        DIRTY_RECTS = getattr(dummy_mod, 'DIRTY_RECTS', False)
+        ANIMATION_BACKEND = getattr(dummy_mod, 'ANIMATION_BACKEND', None)
+        PROFILE = getattr(dummy_mod, 'PROFILE', False)
+        MAX_SPRITES = getattr(dummy_mod, 'MAX_SPRITES', Globals.MAX_SPRITES)
+        PRELOAD = getattr(dummy_mod, 'PRELOAD', False)
 
-    predigame.init(path, WIDTH * SIZE, HEIGHT * SIZE, TITLE, grid = SIZE, bg = BACKGROUND, fullscreen = FULLSCREEN, collisions = COLLISIONS)
+    predigame.init(path, WIDTH * SIZE, HEIGHT * SIZE, TITLE, grid = SIZE, bg = BACKGROUND, fullscreen = FULLSCREEN, collisions = COLLISIONS, tick_rate = TICK_RATE, headless = headless, dirty_rects = DIRTY_RECTS, animation_backend = ANIMATION_BACKEND, profile = PROFILE, max_sprites = MAX_SPRITES, preload = PRELOAD, record = record, replay = replay)
 
     exec(code, mod.__dict__)
 
-    while True:
+    frame = 0
+    while frames is None or frame < frames:
         predigame.main_loop()
+        frame += 1
+        if predigame.HEADLESS and predigame.game_over:
+            break
+    predigame.quit()
 
 def pull_game():
     if len(sys.argv) != 3:
@@ -158,6 +210,29 @@ def get_games():
             print('{0:10} \t {1}'.format(name, desc))
 
 
+def pack_game():
+    """ compile a game's images, actors and backgrounds into a pack file that loads without decoding """
+    if len(sys.argv) != 3:
+        print('Usage: pred pack <game file>')
+        sys.exit()
+    path = os.path.join(os.getcwd(), sys.argv[2])
+    if not os.path.isfile(path):
+        err()
+    from . import api
+    from .Pack import build, PACK_FILE
+    code, mod = load_module(path, api)
+    dummy_mod = ModuleType('dummy')
+    try:
+        exec(code, dummy_mod.__dict__)
+    except:
+        pass
+    SIZE = getattr(dummy_mod, 'SIZE', 50)
+    WIDTH = getattr(dummy_mod, 'WIDTH', 16) * SIZE
+    HEIGHT = getattr(dummy_mod, 'HEIGHT', 16) * SIZE
+
+    count = build(PACK_FILE, WIDTH, HEIGHT)
+    print('Packed {} files into {}'.format(count, PACK_FILE))
+
 def new_game():
     if len(sys.argv) != 3:
         print('Usage: pred new <game>')
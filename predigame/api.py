@@ -3,7 +3,7 @@ from random import uniform as rand
 from random import randint
 from random import choice, shuffle
 from types import MethodType
-from .predigame import display, actor, image, level, maze, shape, background, sound, text, grid, time, callback, score, get_score, timer, stopwatch, reset_score, destroyall, pause, resume, gameover, reset, quit, screenshot
+from .predigame import display, actor, image, level, maze, shape, background, sound, text, grid, time, callback, score, get_score, timer, stopwatch, reset_score, destroyall, pause, resume, gameover, reset, quit, screenshot, stats, refresh_assets, preload, collides
 from .constants import *
 from .utils import register_keydown as keydown, at, get, has_tag
 from .utils import animate, player_physics
@@ -0,0 +1,182 @@
+"""
+    Predigame scene-scaling benchmarks. synthetic scenes are built with N sprites
+    (shapes, images, actors, collision pairs, mazes, timers) and run headless for a
+    number of frames. frame rate, per-phase frame time and resident and peak memory are written
+    as JSON so results can be compared between versions.
+
+    pred bench [--scenes shapes,images] [--sizes 100,1000] [--frames 120] [--out results.json]
+    pred bench --compare old.json new.json
+"""
+import sys, os, gc, json, math, random, platform
+from time import perf_counter
+from .. import predigame as p
+from ..Globals import Globals
+from .scenes import SCENES
+
+SIZES = (100, 1000, 3000, 9000)
+FRAMES = 120
+WARMUP = 10
+WIDTH = 1500
+HEIGHT = 1000
+USAGE = 'Usage: pred bench [--scenes shapes,images] [--sizes 100,1000] [--frames 120] [--out results.json]'
+
+def _grid(scene, n):
+    """ mazes scale with the number of grid cells, everything else uses the default grid """
+    if scene == 'maze':
+        # the grid size has to divide the window evenly
+        target = math.sqrt(WIDTH * HEIGHT / float(n))
+        sizes = [g for g in range(5, 101) if WIDTH % g == 0 and HEIGHT % g == 0]
+        return max([g for g in sizes if g <= target] or sizes[:1])
+    return 50
+
+def _peak_rss_kb():
+    """ the peak resident memory of the process in KB (0 where it isn't available) """
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, linux KB
+    return peak / 1024.0 if sys.platform == 'darwin' else float(peak)
+
+def _rss_kb():
+    """
+        resident memory of the process in KB. this includes the pixels SDL allocates for
+        surfaces, which python's own allocation tracking can't see. where the current
+        value isn't available the peak is used.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024.0
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_kb()
+
+def _clear_caches():
+    """ forget everything loaded or transformed by earlier scenes, so every scene starts cold """
+    Globals.cache = {}
+    Globals.transforms.clear()
+    p.images.clear()
+    p.actors.clear()
+
+def run_scene(scene, n, frames = FRAMES, seed = 0):
+    """ build and run a single scene of size `n`. returns a dictionary of measurements """
+    random.seed(seed)
+    _clear_caches()
+    p.init(os.path.abspath(__file__), WIDTH, HEIGHT, 'Predigame Benchmark', grid = _grid(scene, n), headless = True, tick_rate = 45)
+    p.reset(soft = True)
+
+    # let the previous scene's sprites go before measuring
+    gc.collect()
+    before = _rss_kb()
+    peak_before = _peak_rss_kb()
+    start = perf_counter()
+    SCENES[scene](n)
+    build = perf_counter() - start
+    for i in range(WARMUP):
+        p.main_loop()
+    memory = max(0.0, _rss_kb() - before)
+    # the peak includes short lived allocations made while building and warming up.
+    # it is only meaningful when the scene runs in its own process
+    peak = max(0.0, _peak_rss_kb() - peak_before)
+
+    p.profiler.reset()
+    start = perf_counter()
+    for i in range(frames):
+        p.main_loop()
+    elapsed = perf_counter() - start
+
+    stats = p.stats()
+    return {
+        'scene': scene,
+        'n': n,
+        'sprites': len(p.globs.sprites),
+        'frames': frames,
+        'fps': frames / elapsed,
+        'build_ms': build * 1000.0,
+        'memory_kb': memory,
+        'peak_kb': peak,
+        'frame_ms': stats.pop('frame'),
+        'phases': stats
+    }
+
+def _run_isolated(scene, n, frames):
+    """ run a scene in a new process, so memory freed by earlier scenes can't be reused """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers = 1, mp_context = multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_scene, scene, n, frames).result()
+
+def run(scenes = None, sizes = SIZES, frames = FRAMES, output = None, isolate = True):
+    """
+        run every scene at every size. results are printed and optionally saved as JSON.
+        with `isolate` every scene runs in its own process.
+    """
+    from .. import __version__
+    import pygame
+    if scenes is None:
+        scenes = list(SCENES)
+    results = []
+    for scene in scenes:
+        for n in sizes:
+            # leave some room for players and scoreboards
+            n = min(n, Globals.MAX_SPRITES - 16)
+            result = _run_isolated(scene, n, frames) if isolate else run_scene(scene, n, frames)
+            results.append(result)
+            print('{:12} {:6d} {:8.1f} fps {:8.2f} ms/frame (p95 {:.2f}) {:10.0f} KB (peak {:.0f} KB)'.format(
+                scene, n, result['fps'], result['frame_ms']['avg'], result['frame_ms']['p95'], result['memory_kb'], result['peak_kb']))
+    report = {
+        'predigame': __version__,
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'results': results
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Results saved to ' + output)
+    return report
+
+def compare(old_file, new_file):
+    """ print the change in frame rate and frame time between two result files """
+    old = json.load(open(old_file))
+    new = json.load(open(new_file))
+    previous = {(r['scene'], r['n']): r for r in old['results']}
+    print('{:12} {:>6} {:>10} {:>10} {:>8}'.format('scene', 'n', 'old fps', 'new fps', 'change'))
+    for result in new['results']:
+        key = (result['scene'], result['n'])
+        if key not in previous:
+            continue
+        before = previous[key]['fps']
+        after = result['fps']
+        print('{:12} {:6d} {:10.1f} {:10.1f} {:+7.1f}%'.format(key[0], key[1], before, after, (after - before) / before * 100.0))
+
+def _option(args, name, default):
+    if name not in args:
+        return default
+    idx = args.index(name)
+    if idx + 1 >= len(args):
+        sys.exit(USAGE)
+    value = args[idx + 1]
+    del args[idx:idx + 2]
+    return value
+
+def main(args):
+    """ command line entry point for `pred bench` """
+    if '--compare' in args:
+        idx = args.index('--compare')
+        if len(args) < idx + 3:
+            sys.exit('Usage: pred bench --compare old.json new.json')
+        compare(args[idx + 1], args[idx + 2])
+        return
+
+    scenes = _option(args, '--scenes', None)
+    if scenes is not None:
+        scenes = scenes.split(',')
+        for scene in scenes:
+            if scene not in SCENES:
+                sys.exit('Unknown scene {}. Options are: {}'.format(scene, ', '.join(SCENES)))
+    sizes = [int(n) for n in _option(args, '--sizes', ','.join(str(n) for n in SIZES)).split(',')]
+    frames = int(_option(args, '--frames', FRAMES))
+    output = _option(args, '--out', None)
+    run(scenes, sizes, frames, output)
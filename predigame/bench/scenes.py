@@ -0,0 +1,93 @@
+# synthetic benchmark scenes. each scene takes the number of things to create (N)
+# and builds them using the same public functions a game would use.
+import random, pygame
+from functools import partial
+from .. import predigame as p
+from ..constants import *
+from ..utils import rand_pos, track_astar, graze
+
+IMAGE = '__bench__'
+ACTOR = '__bench__'
+
+def _assets():
+    """ register in-memory images and actors so scenes don't need any files """
+    if IMAGE not in p.images:
+        surface = pygame.Surface((64, 64), pygame.SRCALPHA)
+        pygame.draw.circle(surface, (240, 200, 40), (32, 32), 30)
+        pygame.draw.circle(surface, (200, 150, 20), (32, 32), 20, 4)
+        p.images[IMAGE] = surface
+
+    if ACTOR not in p.actors:
+        states = {}
+        actions = [IDLE, WALK]
+        for direction in (LEFT, RIGHT, FRONT, BACK):
+            actions.append(IDLE + '_' + direction)
+            actions.append(WALK + '_' + direction)
+        for action in actions:
+            states[action] = []
+            for frame in range(4):
+                surface = pygame.Surface((48, 64), pygame.SRCALPHA)
+                pygame.draw.ellipse(surface, (60, 160 + frame * 20, 60), (4, frame * 2, 40, 60 - frame * 2))
+                states[action].append(surface)
+        p.actors[ACTOR] = states
+
+def shapes(n):
+    """ N shapes, every third one floating around """
+    for i in range(n):
+        s = p.shape(pos=rand_pos())
+        if i % 3 == 0:
+            s.float(0.5)
+
+def images(n):
+    """ N images, every other one spinning """
+    _assets()
+    for i in range(n):
+        s = p.image(IMAGE, pos=rand_pos())
+        if i % 2 == 0:
+            s.spin(random.uniform(0.5, 2))
+
+def actors(n):
+    """ N actors tracking a player with a* """
+    _assets()
+    player = p.actor(ACTOR, pos=(0, 0), tag='player')
+    for i in range(n):
+        a = p.actor(ACTOR, pos=rand_pos(), tag='zombie').speed(2)
+        a.wander(partial(track_astar, a, ['player']), time=random.uniform(0.5, 1.5))
+
+def collisions(n):
+    """ N moving pairs of sprites checked for (pixel) collisions """
+    _assets()
+    hits = []
+    for i in range(n // 2):
+        target = p.image(IMAGE, pos=rand_pos(), tag='target').float(1)
+        bullet = p.shape(CIRCLE, RED, rand_pos(), 0.5, tag='bullet').bouncy()
+        bullet.collides(target, lambda a, b: hits.append(1))
+
+def maze(n):
+    """ a random maze (the grid is sized so the board has about N cells) """
+    p.maze()
+    for i in range(min(n // 100, 50)):
+        s = p.shape(CIRCLE, BLUE, pos=rand_pos())
+        s.wander(partial(graze, s), time=0.25)
+
+def timers(n):
+    """ scoreboards in every corner and N repeating timers """
+    p.score(0, pos=UPPER_LEFT)
+    p.score(0, pos=UPPER_RIGHT, method=VALUE)
+    p.timer(value=999, pos=LOWER_RIGHT)
+    p.stopwatch(pos=LOWER_LEFT)
+    counter = [0]
+    def tick():
+        counter[0] += 1
+    for i in range(n):
+        p.callback(tick, random.uniform(0.01, 0.5), FOREVER)
+    p.callback(lambda: p.score(1, pos=UPPER_LEFT), 0.1, FOREVER)
+
+SCENES = {
+    'shapes': shapes,
+    'images': images,
+    'actors': actors,
+    'collisions': collisions,
+    'maze': maze,
+    'timers': timers,
+}
@@ -0,0 +1,130 @@
+# loading of .pga actor archives. a .pga file is a zip archive with a directory per
+# state (idle, walk_left, ...) holding the png frames of that state.
+import os, io, json, mmap, zlib, struct, hashlib, zipfile, pygame
+from .ImageCache import cache_dir
+
+MAGIC = b'PGA1'
+HEADER = struct.Struct('<4sI')
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+
+_pool = None
+
+def _workers():
+    """ the thread pool used for decoding frames (created on first use) """
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _pool = ThreadPoolExecutor(max_workers = min(8, os.cpu_count() or 1))
+    return _pool
+
+def _decode(data, compress_type, name):
+    if compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -15)
+    elif compress_type != zipfile.ZIP_STORED:
+        raise ValueError('unsupported compression for ' + name)
+    return pygame.image.load(io.BytesIO(data), name)
+
+def _cache_file(path):
+    stat = os.stat(path)
+    key = '{}|{}|{}'.format(os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    return os.path.join(cache_dir(), hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pgac')
+
+def _read_cache(file):
+    """ load states saved by `_write_cache`. the frames share memory with the mapped file """
+    with open(file, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_COPY)
+    magic, length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('not a predigame actor cache: ' + file)
+    base = HEADER.size + length
+    states = {}
+    for state, frames in json.loads(data[HEADER.size:base].decode('utf-8')):
+        states[state] = []
+        for width, height, offset in frames:
+            start = base + offset
+            states[state].append(pygame.image.frombuffer(memoryview(data)[start:start + width * height * 4], (width, height), 'RGBA'))
+    return states
+
+def rgba(surface):
+    """ the pixels of a surface as RGBA bytes. colorkey transparency becomes alpha """
+    if not surface.get_flags() & pygame.SRCALPHA:
+        frame = pygame.Surface(surface.get_size(), pygame.SRCALPHA, 32)
+        frame.blit(surface, (0, 0))
+        surface = frame
+    return pygame.image.tostring(surface, 'RGBA')
+
+def _write_cache(file, states):
+    index = []
+    chunks = []
+    offset = 0
+    for state, frames in states.items():
+        index.append([state, []])
+        for frame in frames:
+            raw = rgba(frame)
+            index[-1][1].append([frame.get_width(), frame.get_height(), offset])
+            chunks.append(raw)
+            offset += len(raw)
+    header = json.dumps(index).encode('utf-8')
+    try:
+        os.makedirs(os.path.dirname(file), exist_ok = True)
+        tmp = file + '.' + str(os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, file)
+    except OSError:
+        # caching is only an optimization
+        pass
+
+def _read_archive(path):
+    """ decode the png frames of an archive on the worker pool. members are read
+        straight out of the memory mapped file """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    views = []
+    members = []
+    try:
+        with zipfile.ZipFile(data) as pga:
+            for info in pga.infolist():
+                if not info.filename.endswith('.png'):
+                    continue
+                header = LOCAL_HEADER.unpack_from(data, info.header_offset)
+                start = info.header_offset + LOCAL_HEADER.size + header[10] + header[11]
+                view = memoryview(data)[start:start + info.compress_size]
+                views.append(view)
+                members.append((info.filename.split('/')[0], _workers().submit(_decode, view, info.compress_type, info.filename)))
+
+        states = {}
+        for state, frame in members:
+            if not state in states:
+                states[state] = []
+            states[state].append(frame.result())
+        return states
+    finally:
+        # workers may still be reading if a frame failed
+        for state, frame in members:
+            frame.exception()
+        for view in views:
+            view.release()
+        data.close()
+
+def load(path, cache = True):
+    """
+        load an actor archive. returns a dictionary of state names and the list of
+        frames (surfaces) of each state. with `cache` the decoded frames are also saved
+        in the predigame cache directory, so the next load skips decoding.
+    """
+    if cache:
+        file = _cache_file(path)
+        if os.path.isfile(file):
+            try:
+                return _read_cache(file)
+            except (OSError, ValueError, struct.error):
+                pass
+
+    states = _read_archive(path)
+    if cache and states:
+        _write_cache(file, states)
+    return states
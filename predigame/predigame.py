@@ -1,17 +1,23 @@
 import sys, os, random, datetime, mimetypes, pygame, json
 from numbers import Number
 from functools import partial
-from time import time as get_time, gmtime, strftime
+from time import time as get_time, gmtime, strftime, perf_counter
 from pygame.locals import *
 from .Globals import Globals
-from .utils import load_module, register_cell, register_keydown, rand_maze, rand_pos, rand_color, roundup, animate, score_pos
-from .Sprite import Sprite
+from .utils import load_module, register_cell, unregister_cell, register_keydown, rand_maze, rand_pos, rand_color, roundup, animate, score_pos
+from .Sprite import Sprite, _collision_seq, _handler
 from .Actor import Actor
 from .Level import Level
+from .Scheduler import Scheduler
+from .Profiler import Profiler
+from .Recorder import Recorder, Replayer
+from .Assets import Assets
+from .ImageCache import ImageCache
+from . import pga
+from .Pack import Pack, PACK_FILE
 from .constants import *
 import traceback
 import io
-from zipfile import ZipFile
 
 
 levels = []
@@ -24,7 +30,27 @@ game_over = False
 sounds = {}
 images = {}
 actors = {}
-callbacks = []
+assets = None
+image_cache = ImageCache()
+pack = None
+callbacks = Scheduler()
+TICK_RATE = None
+HEADLESS = False
+DIRTY_RECTS = False
+ANIMATION_BACKEND = None
+profiler = Profiler()
+show_stats = False
+_stats_surface = None
+# frames drawn since the overlay was last rendered
+_stats_age = 0
+_stats_font = None
+recorder = None
+replayer = None
+_dirty_full = True
+_drawn = {}
+MAX_STEPS = 5
+_accumulator = 0
+_sim_time = 0.0
 DEFAULT_COLOR = (220, 220, 220)
 _background_color = _background = DEFAULT_COLOR
 DISPLAY_MAIN = '__main__'
@@ -34,6 +60,7 @@ display_active = DISPLAY_MAIN
 def background(bg = None):
     """ set the background color or image """
     global _background, _background_color
+    _refresh()
     if bg is None:
         from urllib.request import urlopen
         import io
@@ -43,15 +70,13 @@ def background(bg = None):
         return
 
     if isinstance(bg, str):
-        if not os.path.isdir('backgrounds'):
+        if not assets.exists('backgrounds'):
             sys.exit('ERROR: background images need to be stored in the \'backgrounds\' directory')
             return
-        files = os.listdir('backgrounds')
-        for file in files:
-            nfile = '%s.' % file
-            if nfile.lower().startswith(bg.lower()):
-                _background = pygame.image.load(os.path.join('backgrounds', file)).convert()
-                break
+        path = assets.path('backgrounds', bg)
+        if path is not None:
+            packed = pack.image(path) if pack is not None else None
+            _background = (packed or pygame.image.load(path)).convert()
         else:
             sys.exit('ERROR: background image doesn\'t exist. File must be saved in \'backgrounds\' directory: ' + bg)
 
@@ -59,6 +84,7 @@ def background(bg = None):
         _background = pygame.transform.scale(_background, (WIDTH, HEIGHT))
     elif isinstance(bg, Sprite):
         globs.sprites.remove(bg)
+        unregister_cell(bg)
         globs.backgrounds.append(bg)
     else :
         _background = _background_color = bg
@@ -88,6 +114,7 @@ def _display_swap(name) :
         # swap to main
         displays[name][1].destroy()
         display_active = DISPLAY_MAIN
+        _refresh()
         update_game = not update_game
     else:
         if display_active != DISPLAY_MAIN:
@@ -100,40 +127,145 @@ def _display_swap(name) :
 
 
 def init(path, width = 800, height = 800, title = 'Predigame', bg = (220, 220, 220), fullscreen = False, collisions = True, **kwargs):
-    global globs, RUN_PATH, WIDTH, HEIGHT, FPS, GRID_SIZE, SURF, FULLSCREEN, COLLISIONS, clock, start_time, sounds
+    global globs, RUN_PATH, WIDTH, HEIGHT, FPS, TICK_RATE, HEADLESS, DIRTY_RECTS, ANIMATION_BACKEND, show_stats, GRID_SIZE, SURF, FULLSCREEN, COLLISIONS, clock, start_time, sounds, assets, pack, recorder, replayer
 
     RUN_PATH = path
     WIDTH, HEIGHT = width, height
     FPS = kwargs.get('fps', 45)
+    TICK_RATE = kwargs.get('tick_rate', None)
+    HEADLESS = kwargs.get('headless', False)
+    if kwargs.get('replay', None):
+        # replays are driven by the recording, not by a window
+        replayer = Replayer(kwargs['replay'])
+        random.seed(replayer.seed)
+        HEADLESS = True
+    elif kwargs.get('record', None):
+        seed = kwargs.get('seed', int(get_time()))
+        random.seed(seed)
+        recorder = Recorder(kwargs['record'], seed, game=os.path.basename(path), fps=FPS, tick_rate=TICK_RATE)
+        import atexit
+        atexit.register(recorder.close)
+    DIRTY_RECTS = kwargs.get('dirty_rects', False)
+    show_stats = kwargs.get('profile', False)
+    ANIMATION_BACKEND = kwargs.get('animation_backend', None)
+    if ANIMATION_BACKEND == 'numpy':
+        try:
+            import numpy
+        except ImportError:
+            print('numpy is not installed (pip install numpy). Using the default animation backend.')
+            ANIMATION_BACKEND = None
     GRID_SIZE = kwargs.get('grid', 50)
+    Globals.MAX_SPRITES = kwargs.get('max_sprites', Globals.MAX_SPRITES)
     FULLSCREEN = fullscreen
     COLLISIONS = collisions
+    if HEADLESS:
+        # no window or sound card needed
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
     pygame.mixer.pre_init(22050, -16, 2, 1024) # sound delay fix
     pygame.init()
     pygame.display.set_caption(title)
     SURF = display(None, DISPLAY_MAIN)
     clock = pygame.time.Clock()
+    assets = Assets()
+    if os.path.isfile(PACK_FILE):
+        try:
+            pack = Pack(PACK_FILE)
+        except (OSError, ValueError) as e:
+            print('Ignoring ' + PACK_FILE + ': ' + str(e))
 
     background(bg)
 
-    globs = Globals(WIDTH, HEIGHT, GRID_SIZE, COLLISIONS)
+    globs = _globals()
     Globals.instance = globs
 
 
 
-    loading_font = pygame.font.Font(None, 72)
-    SURF.blit(loading_font.render('LOADING...', True, (235, 235, 235)), (25, 25))
-    pygame.display.update()
+    _loading()
 
     images['__error__'] = pygame.image.load(os.path.join(os.path.dirname(__file__), 'images', 'error.png'))
     images['__screenshot__'] = pygame.image.load(os.path.join(os.path.dirname(__file__), 'images', 'screenshot.png'))
 
+    if kwargs.get('preload', False):
+        preload()
+
     start_time = get_time()
 
 
 
+def _loading(done = 0, total = 0):
+    """ draw the loading screen. shows a progress bar while assets are preloaded """
+    SURF.fill((0, 0, 0))
+    loading_font = pygame.font.Font(None, 72)
+    SURF.blit(loading_font.render('LOADING...', True, (235, 235, 235)), (25, 25))
+    if total > 0:
+        width = WIDTH - 50
+        pygame.draw.rect(SURF, (235, 235, 235), (25, 90, width, 20), 2)
+        pygame.draw.rect(SURF, (235, 235, 235), (25, 90, int(width * done / float(total)), 20))
+    pygame.display.update()
+    # keep the window responsive
+    pygame.event.pump()
+
+def preload(kinds = ('images', 'actors', 'sounds'), names = None):
+    """
+        load game assets ahead of time, so the first `image()`, `actor()` or `sound()` call
+        for an asset doesn't stall the game. files are decoded in background threads while
+        the loading screen shows the progress.
+
+        :param kinds: the kinds of assets to load. default is `images`, `actors` and `sounds`.
+
+        :param names: only load assets with these names. default loads everything.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    mime_types = ('image/png', 'image/jpeg', 'image/gif')
+    # each job is (cache, the names the asset is found by, loader, loader argument).
+    # names are lower case, the same as the keys `image()`, `actor()` and `sound()` use
+    jobs = []
+    if 'images' in kinds:
+        for file, keys in assets.names_of('images').items():
+            if mimetypes.guess_type(file)[0] in mime_types:
+                jobs.append((images, keys, _load_image, keys[0]))
+    if 'actors' in kinds:
+        for file, keys in assets.names_of('actors').items():
+            if file.lower().endswith('.pga'):
+                jobs.append((actors, keys, _load_actor, keys[0]))
+    if 'sounds' in kinds:
+        # sounds are only found by their exact name
+        for file in assets.list('sounds'):
+            if file.lower().endswith(('.wav', '.ogg')):
+                jobs.append((sounds, [os.path.splitext(file)[0].lower()], pygame.mixer.Sound, os.path.join('sounds', file)))
+    if names is not None:
+        names = set(name.lower() for name in names)
+        jobs = [job for job in jobs if names.intersection(job[1])]
+    jobs = [job for job in jobs if not all(key in job[0] for key in job[1])]
+    if not jobs:
+        return
+
+    _loading(0, len(jobs))
+    with ThreadPoolExecutor(max_workers = min(8, os.cpu_count() or 1)) as pool:
+        futures = {pool.submit(job[2], job[3]): job for job in jobs}
+        for done, future in enumerate(as_completed(futures)):
+            cache, keys = futures[future][:2]
+            try:
+                value = future.result()
+                if value is not None:
+                    for key in keys:
+                        cache.setdefault(key, value)
+            except (Exception, SystemExit) as e:
+                # the asset will be loaded (and the error reported) when the game uses it
+                print('Unable to preload ' + keys[0] + ': ' + str(e))
+            _loading(done + 1, len(jobs))
+
+def _globals():
+    """ build a fresh set of game globals using the configured animation backend """
+    g = Globals(WIDTH, HEIGHT, GRID_SIZE, COLLISIONS)
+    if ANIMATION_BACKEND == 'numpy':
+        from .ArrayAnimator import ArrayAnimator
+        g.animations.animator = ArrayAnimator()
+    return g
+
 def _create_image(name, pos, center, size, tag):
-    img = images[name]
+    img = images[name.lower()]
     rect = img.get_rect()
     new_width = 0
     new_height = 0
@@ -174,45 +306,40 @@ def _create_actor(actions, name, pos, center, size, abortable, tag):
     s = Actor(actions, rect, tag, abortable, name=name)
     return s
 
+def _shape_surface(kind, color, size, outline):
+    """ the surface of a shape. shapes that look the same share it, so it must not be drawn on """
+    def draw():
+        surface = pygame.Surface(size)
+        surface.fill(_background_color)
+        surface.set_colorkey(_background_color)
+        if kind == CIRCLE:
+            pygame.draw.circle(surface, color, (size[0] // 2, size[1] // 2), size[0] // 2, outline)
+        elif kind == ELLIPSE:
+            pygame.draw.ellipse(surface, color, (0, 0) + size, outline)
+        else:
+            pygame.draw.rect(surface, color, (0, 0) + size, outline)
+        return surface
+
+    return Globals.transforms.shape((kind, tuple(color), size, outline, tuple(_background_color)), draw)
+
 def _create_rectangle(color, pos, size, outline, tag):
     rect = pygame.Rect(pos[0] * globs.GRID_SIZE, pos[1] * globs.GRID_SIZE, size[0] * globs.GRID_SIZE, size[1] * globs.GRID_SIZE)
-    surface = pygame.Surface(rect.size)
-    surface.fill(_background_color)
-    surface.set_colorkey(_background_color)
-    pygame.draw.rect(surface, color, (0, 0, rect.width, rect.height), outline)
+    surface = _shape_surface(RECT, color, rect.size, outline)
 
     return Sprite(surface, rect, tag, name=color)
 
 def _create_circle(color, pos, size, outline, tag):
     rect = pygame.Rect(pos[0] * globs.GRID_SIZE, pos[1] * globs.GRID_SIZE, size * globs.GRID_SIZE, size * globs.GRID_SIZE)
-    surface = pygame.Surface(rect.size)
-    surface.fill(_background_color)
-    surface.set_colorkey(_background_color)
-    pygame.draw.circle(surface, color, (rect.width // 2, rect.height // 2), rect.width // 2, outline)
+    surface = _shape_surface(CIRCLE, color, rect.size, outline)
 
     return Sprite(surface, rect, tag, name=color)
 
 def _create_ellipse(color, pos, size, outline, tag):
     rect = pygame.Rect(pos[0] * globs.GRID_SIZE, pos[1] * globs.GRID_SIZE, size[0] * globs.GRID_SIZE, size[1] * globs.GRID_SIZE)
-    surface = pygame.Surface(rect.size)
-    surface.fill(_background_color)
-    surface.set_colorkey(_background_color)
-    pygame.draw.ellipse(surface, color, (0, 0, rect.width, rect.height), outline)
+    surface = _shape_surface(ELLIPSE, color, rect.size, outline)
 
     return Sprite(surface, rect, tag, name=color)
 
-def _check_image_size(ifile):
-    """ make sure we don't load humongo images """
-    from PIL import Image
-    img = Image.open(ifile)
-    basewidth = 250
-    if img.size[0] > basewidth or img.size[1] > basewidth:
-        print('checking image (' + ifile + ') size --> ' + str(img.size))
-        wpercent = (basewidth/float(img.size[0]))
-        hsize = int((float(img.size[1])*float(wpercent)))
-        img = img.resize((basewidth,hsize), Image.ANTIALIAS)
-        img.save(ifile)
-
 
 def level(_level):
     """ create a game with levels """
@@ -222,7 +349,7 @@ def level(_level):
         sys.exit('Levels must be subclases of the Level class or a list of level functions --> ' + str(_level))
     global current_level, globs
     current_level = _level
-    globs = Globals(WIDTH, HEIGHT, GRID_SIZE, COLLISIONS)
+    globs = _globals()
     Globals.instance = globs
     if isinstance(current_level, Level):
         current_level.setup()
@@ -234,12 +361,26 @@ def level(_level):
         current_level.completed = levels[current_level_idx].completed
         current_level.setup()
 
+def _load_image(name):
+    """ load an image from the `images` directory. returns `None` if it can't be found """
+    for ifile in assets.find('images', name):
+        if pack is not None:
+            img = pack.image(ifile)
+            if img is not None:
+                return img
+        try:
+            # make sure we don't load humongo images
+            return image_cache.load(ifile)
+        except:
+            traceback.print_exc(file=sys.stdout)
+    return None
+
 def image(name = None, pos = None, center = None, size = 1, tag = '', order=FRONT):
     if not name:
-        if os.path.isdir('images/'):
+        if assets.exists('images'):
             imgs = []
             mime_types = ('image/png', 'image/jpeg', 'image/gif')
-            for img in os.listdir('images/'):
+            for img in assets.list('images'):
                 if mimetypes.guess_type(img)[0] in mime_types:
                     imgs.append(img)
             if len(imgs):
@@ -249,24 +390,11 @@ def image(name = None, pos = None, center = None, size = 1, tag = '', order=FRON
         else:
             name = '__error__'
 
-    if not name in images:
-        cname = '%s.' % name
-        if os.path.isdir('images/'):
-            for img in os.listdir('images/'):
-                cimg = '%s' % img
-                if cimg.lower().startswith(cname.lower()) :
-                    try:
-                        ifile = os.path.join('images', img)
-                        _check_image_size(ifile)
-                        img = pygame.image.load(ifile)
-                        images[name] = img
-                    except:
-                        traceback.print_exc(file=sys.stdout)
-                        continue
-
-                    break
-            else: # if no image is found and the loop continues ubroken
-                name = '__error__'
+    # loaded assets are kept by lower case name, the same way they are found
+    if not name.lower() in images:
+        img = _load_image(name)
+        if img is not None:
+            images[name.lower()] = img
         else:
             name = '__error__'
 
@@ -285,45 +413,32 @@ def image(name = None, pos = None, center = None, size = 1, tag = '', order=FRON
 
     return img
 
+def _load_actor(name):
+    """ load the frames of every state of an actor from its .pga file """
+    if not assets.exists('actors'):
+        sys.exit('ERROR:  \'actors\' directory is missing')
+    for pga_file in assets.find('actors', name):
+        states = pack.actor(pga_file) if pack is not None else None
+        if states is not None:
+            return states
+        try:
+            states = pga.load(pga_file)
+        except:
+            traceback.print_exc(file=sys.stdout)
+            sys.exit('Unable to find or load actor ' + str(name) + '. actors/' + str(name) + '.pga. may be bad!')
+        return states
+    sys.exit('ERROR: actor {} does not exist.'.format(name))
+
 def actor(name = None, pos = None, center = None, size = 1, abortable = False, tag = ''):
     if not name:
         sys.exit('ERROR: Actor name is missing!')
-    if not os.path.isdir('actors'):
-        sys.exit('ERROR:  \'actors\' directory is missing')
-
-    loaded = False
-    states = {}
 
-    if name in actors:
-        loaded = True
-        states = actors[name]
+    if name.lower() in actors:
+        states = actors[name.lower()]
     else:
-        files = os.listdir('actors')
-        cname = '%s.' % name
-        for file in files:
-            cfile = '%s' % file
-            if cfile.lower().startswith(cname.lower()):
-                pga_file = os.path.join('actors', file)
-                try:
-                    with ZipFile(pga_file) as pga:
-                        lst = pga.namelist()
-                        for f in lst:
-                            if f.endswith('.png'):
-                                state = f.split('/')[0]
-                                if not state in states:
-                                    states[state] = []
-                                with pga.open(f) as afile:
-                                    states[state].append(pygame.image.load(io.BytesIO(afile.read())))
-                                    loaded = True
-                    actors[name] = states
-                    break
-                except:
-                    traceback.print_exc(file=sys.stdout)
-                    sys.exit('Unable to find or load actor ' + str(name) + '. actors/' + str(name) + '.pga. may be bad!')
-        else:
-            sys.exit('ERROR: actor {} does not exist.'.format(name))
+        states = actors[name.lower()] = _load_actor(name)
 
-    if not loaded:
+    if not states:
         sys.exit('Unable to find or load actor ' + str(name) + '. Does actors/' + str(name) + '.pga exist?')
 
     if not center and not pos:
@@ -345,7 +460,7 @@ def maze(name=None, callback=None):
     if not name:
         return rand_maze(callback)
 
-    path = 'mazes/' + name + '.json'
+    path = assets.path('mazes', name, ('json',)) or 'mazes/' + name + '.json'
 
     cells = json.load(open(path, 'r'))
 
@@ -409,7 +524,7 @@ def text(string, color = None, pos = None, size = 1, tag = ''):
     pos = pos[0] * GRID_SIZE, pos[1] * GRID_SIZE
 
     surface = font.render(string, True, color)
-    text = Sprite(surface, pygame.Rect(pos[0], pos[1], font_width, font_height), tag)
+    text = Sprite(surface, pygame.Rect(pos[0], pos[1], font_width, font_height), tag, cache=False)
 
     globs.sprites.append(text)
     return globs.sprites[-1]
@@ -427,24 +542,20 @@ def sound(name = None, plays = 1, duration = 0):
     plays = plays - 1
     duration = int(duration * 1000)
 
+    if name and name.lower() in sounds:
+        sounds[name.lower()].play(plays, duration)
+        return
+
     path = None
     snd_exts = ('wav', 'ogg')
     if name:
-        path = 'sounds/' + name + '.'
-        for ext in snd_exts:
-            if os.path.isfile(path + ext.lower()):
-                path += ext.lower()
-                break
-
-            if os.path.isfile(path + ext.upper()):
-                path += ext.upper()
-                break
-        else:
+        path = assets.path('sounds', name, snd_exts)
+        if path is None:
             print('Error: Sound ' + name + ' not found')
     else:
-        if os.path.isdir('sounds/'):
+        if assets.exists('sounds'):
             snds = []
-            for snd in os.listdir('sounds/'):
+            for snd in assets.list('sounds'):
                 for ext in snd_exts:
                     if snd.lower().endswith(ext):
                         snds.append(snd)
@@ -456,11 +567,19 @@ def sound(name = None, plays = 1, duration = 0):
         else:
             print('Error: Sounds directory does not exist')
 
-    if not name in sounds:
+    if not name.lower() in sounds:
         snd = pygame.mixer.Sound(path)
-        sounds[name] = snd
+        sounds[name.lower()] = snd
 
-    sounds[name].play(plays, duration)
+    sounds[name.lower()].play(plays, duration)
+
+def refresh_assets():
+    """
+        look for new or removed files in the `images`, `actors`, `backgrounds`, `sounds`
+        and `mazes` directories. these directories are only checked when the game starts,
+        call this if the game adds asset files while it is running.
+    """
+    assets.refresh()
 
 def grid():
     """
@@ -469,6 +588,16 @@ def grid():
     global show_grid
     show_grid = True
 
+def stats():
+    """
+        returns frame timing statistics for the recent frames (about 5 seconds worth). the
+        result has an entry for each phase of a frame - `events`, `update`, `collisions`,
+        `animations`, `callbacks`, `level`, `draw` and `display` - as well as the `frame`
+        as a whole. each entry holds the `avg`, `p95`, `p99` and `max` time in milliseconds.
+        press F10 to show these numbers on screen.
+    """
+    return profiler.stats()
+
 def time():
     """
         returns the time (in seconds) since the start of the game
@@ -483,9 +612,30 @@ def callback(function, wait, repeat=0):
 
         :param wait: the amount of time to **wait** for the callback to execute.
 
-        :param repeat: the number of times this callback should repeat (default 0)
+        :param repeat: the number of times this callback should repeat (default 0). use `FOREVER` to repeat until cancelled.
+
+        :return: a handle to the callback. call `cancel()` on the handle to stop the callback.
+    """
+    return callbacks.schedule(function, _sim_time + wait, wait, repeat)
+
+def collides(tag, other, callback = None, on_enter = None, on_stay = None, on_exit = None):
     """
-    callbacks.append({'cb': function, 'time': get_time() + wait, 'wait': wait, 'repeat' : repeat})
+        register a callback function for collisions between any sprite tagged `tag` and any
+        sprite tagged `other`, including sprites created later. the callback is called
+        on the `tag` sprite with the `other` sprite as argument, the same as `Sprite.collides()`.
+
+        :param tag: the tag of the sprites that detect the collision
+
+        :param other: the tag of the sprites they collide with
+
+        :param callback: the callback function to invoke when a collision is detected
+
+        :param on_enter, on_stay, on_exit: contact callbacks, as for `Sprite.collides()`
+    """
+    callback = _handler(callback, on_enter, on_stay, on_exit)
+    if tag not in globs.tag_collisions:
+        globs.tag_collisions[tag] = []
+    globs.tag_collisions[tag].append((other, next(_collision_seq), callback))
 
 def reset_score(**kwargs):
     """
@@ -496,7 +646,7 @@ def reset_score(**kwargs):
     pos = kwargs.get('pos', UPPER_LEFT)
     global score_dict
     try:
-        globs.sprites.remove(score_dict[pos]['sprite'])
+        score_dict[pos]['sprite'].destroy()
         del score_dict[pos]
         score(**kwargs)
     except:
@@ -562,7 +712,7 @@ def score(value = 0, **kwargs):
     try:
         scoreboard = score_dict[pos]
         if scoreboard['sprite']:
-            globs.sprites.remove(scoreboard['sprite'])
+            scoreboard['sprite'].destroy()
     except:
         scoreboard = {
             'value': value,
@@ -608,9 +758,9 @@ def score(value = 0, **kwargs):
     surface = font.render(string, True, scoreboard['color'])
     scoreboard['pos'] = grid_position[0] * globs.GRID_SIZE, grid_position[1] * globs.GRID_SIZE
     if pos == UPPER_RIGHT or pos == LOWER_RIGHT:
-        scoreboard['sprite'] = Sprite(surface, pygame.Rect(scoreboard['pos'][0]-font_width, scoreboard['pos'][1], font_width, font_height), globs)
+        scoreboard['sprite'] = Sprite(surface, pygame.Rect(scoreboard['pos'][0]-font_width, scoreboard['pos'][1], font_width, font_height), globs, cache=False)
     else:
-        scoreboard['sprite'] = Sprite(surface, pygame.Rect(scoreboard['pos'][0], scoreboard['pos'][1], font_width, font_height), globs)
+        scoreboard['sprite'] = Sprite(surface, pygame.Rect(scoreboard['pos'][0], scoreboard['pos'][1], font_width, font_height), globs, cache=False)
     globs.sprites.append(scoreboard['sprite'])
     score_dict[pos] = scoreboard
     return scoreboard['value']
@@ -633,8 +783,11 @@ def stopwatch(value=0, goal=999, pos=LOWER_LEFT, color=BLACK, prefix='Duration:
           step=1, goal=goal, prefix=prefix, callback=callback)
 
 def destroyall():
+    for sprite in globs.sprites:
+        unregister_cell(sprite)
     del globs.sprites[:]
     del globs.backgrounds[:]
+    globs.cells.clear()
 
 def pause():
     pygame.event.post(pygame.event.Event(USEREVENT, action = 'pause'))
@@ -674,8 +827,9 @@ def reset(**kwargs):
     globs.keys_registered['keydown'] = {}
     globs.keys_registered['keyup'] = {}
     globs.tags = {}
-    del globs.animations[:]
-    del callbacks[:]
+    globs.tag_collisions = {}
+    globs.animations.clear()
+    callbacks.clear()
     if not kwargs.get('soft', False):
         Globals.cache = {}
         from . import api
@@ -716,35 +870,110 @@ def _draw_grid():
 def _update_animation(animation, delta):
     animation.update(delta)
 
+def _frame_delta():
+    """ the amount of time (in milliseconds) to simulate for this frame. headless runs
+        aren't tied to the wall clock and always advance by one tick """
+    if HEADLESS:
+        return 1000.0 / (TICK_RATE or FPS)
+    return clock.get_time()
+
+def _frame_input():
+    """ the elapsed time, mouse position and events for this frame. these come
+        from the recording when replaying and are logged when recording """
+    if replayer is not None:
+        pygame.event.get()
+        frame = replayer.next()
+        if frame is None:
+            print('Replay complete')
+            quit()
+        return frame
+
+    delta = _frame_delta()
+    mouse = pygame.mouse.get_pos()
+    events = pygame.event.get()
+    if recorder is not None:
+        recorder.frame(delta, mouse, events)
+    return delta, mouse, events
+
+def _step(delta):
+    """ advance the simulation by `delta` milliseconds. when a `TICK_RATE` is set the
+        elapsed time is consumed in fixed steps, catching up with several steps when a
+        frame runs long (at most `MAX_STEPS` per frame) """
+    global _accumulator
+    if not TICK_RATE:
+        _update(delta)
+        return
+
+    step = 1000.0 / TICK_RATE
+    _accumulator += delta
+    steps = 0
+    while _accumulator >= step and steps < MAX_STEPS:
+        _update(step)
+        _accumulator -= step
+        steps += 1
+
+    # too far behind to catch up, drop the backlog rather than spiral
+    if steps == MAX_STEPS:
+        _accumulator = 0
+
 def _update(delta):
+    global _sim_time
+    _sim_time += delta / 1000.0
     time = get_time()
+    start = perf_counter()
     for sprite in globs.backgrounds:
         sprite._update(delta)
 
     for sprite in globs.sprites:
         sprite._update(delta)
-
-    animations = globs.animations
+    profiler.add('update', start)
+
+    start = perf_counter()
+    rules = globs.tag_collisions
+    # background sprites aren't in the cell index, so they can't use the `_cells` check
+    for sprite in list(globs.backgrounds):
+        if (sprite.collisions or sprite._tag_collisions or sprite._tag in rules) and sprite in globs.backgrounds:
+            sprite._handle_collisions()
+    for sprite in list(globs.sprites):
+        # skip anything destroyed by an earlier collision
+        if (sprite.collisions or sprite._tag_collisions or sprite._tag in rules) and sprite._cells is not None:
+            sprite._handle_collisions()
+    profiler.add('collisions', start)
+
+    start = perf_counter()
+    animations = list(globs.animations)
+
+    # fixed, headless and recorded runs must not depend on the wall clock
+    exact = TICK_RATE or HEADLESS or recorder is not None
+    if globs.animations.animator is not None:
+        if exact:
+            globs.animations.animator.update(delta)
+        else:
+            globs.animations.animator.update(delta + 1000 * (get_time() - time))
+    else:
+        for animation in animations:
+            if animation not in globs.animations:
+                continue
+            if exact:
+                animation.update(delta)
+            else:
+                animation.update(delta + 1000 * (get_time() - time))
 
     for animation in animations:
-        animation.update(delta + 1000 * (get_time() - time))
-
-    for index, animation in enumerate(animations):
-        if animation.finished:
-            del globs.animations[index]
+        if animation.finished and animation in globs.animations:
+            globs.animations.remove(animation)
             animation.finish()
+    profiler.add('animations', start)
 
-    for _callback in callbacks:
-        if _callback['time'] <= get_time():
-            _callback['cb']()
-            if _callback['repeat'] > 1:
-                callback(_callback['cb'], _callback['wait'], _callback['repeat']-1)
-            elif _callback['repeat'] == FOREVER:
-                callback(_callback['cb'], _callback['wait'], FOREVER)
-            callbacks.remove(_callback)
+    start = perf_counter()
+    callbacks.run(_sim_time)
+    profiler.add('callbacks', start)
 
     if current_level is not None:
-        if current_level.completed():
+        start = perf_counter()
+        completed = current_level.completed()
+        profiler.add('level', start)
+        if completed:
             next_level = None
             if len(levels) > 0:
                 global current_level_idx
@@ -762,20 +991,138 @@ def _update(delta):
             else:
                 sys.exit('Game successfully completed all levels.')
 
+def _refresh():
+    """ force the next frame to repaint the whole screen """
+    global _dirty_full
+    _dirty_full = True
+
+def _merge_rects(rects):
+    """ combine overlapping rectangles so each screen region is repainted once """
+    merged = []
+    for rect in rects:
+        idx = rect.collidelist(merged)
+        while idx != -1:
+            rect = rect.union(merged.pop(idx))
+            idx = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+def _draw_dirty(SURF):
+    """ only repaint the areas of the screen that changed since the last frame. returns
+        the list of changed rectangles or None when the whole screen was repainted """
+    global _dirty_full, _drawn
+    sprites = globs.backgrounds + globs.sprites
+    drawn = {}
+    dirty = []
+    for sprite in sprites:
+        prev = _drawn.pop(sprite, None)
+        if prev is None:
+            drawn[sprite] = (sprite.rect.copy(), sprite.surface)
+            dirty.append(drawn[sprite][0])
+        elif sprite._dirty or prev[1] is not sprite.surface or prev[0] != sprite.rect:
+            drawn[sprite] = (sprite.rect.copy(), sprite.surface)
+            dirty.append(prev[0])
+            dirty.append(drawn[sprite][0])
+        else:
+            drawn[sprite] = prev
+        sprite._dirty = False
+
+    # anything left over was removed from the scene
+    for rect, surface in _drawn.values():
+        dirty.append(rect)
+    _drawn = drawn
+
+    if _dirty_full:
+        _dirty_full = False
+        _draw_full(SURF)
+        return None
+
+    screen = SURF.get_rect()
+    dirty = _merge_rects([rect.clip(screen) for rect in dirty if rect.colliderect(screen)])
+    rects = [sprite.rect for sprite in sprites]
+    for rect in dirty:
+        SURF.set_clip(rect)
+        if isinstance(_background, pygame.Surface):
+            SURF.blit(_background, rect, rect)
+        else:
+            SURF.fill(_background_color, rect)
+        _blit_all(SURF, [sprites[idx] for idx in rect.collidelistall(rects)])
+        if show_grid:
+            _draw_grid()
+    SURF.set_clip(None)
+
+    return dirty
+
+def _toggle_stats():
+    """ show or hide the frame timing overlay """
+    global show_stats
+    show_stats = not show_stats
+    _refresh()
+
+def _draw_stats(SURF):
+    """ draw the frame timing overlay. returns the area that was drawn """
+    global _stats_surface, _stats_age, _stats_font
+    _stats_age += 1
+    if _stats_surface is None or _stats_age >= 15:
+        _stats_age = 0
+        summary = profiler.stats()
+        lines = ['%-10s %6s %6s %6s' % ('ms', 'avg', 'p95', 'p99')]
+        for phase in sorted(summary, key=lambda p: p != 'frame'):
+            lines.append('%-10s %6.2f %6.2f %6.2f' % (phase, summary[phase]['avg'], summary[phase]['p95'], summary[phase]['p99']))
+        lines.append('fps %.1f  sprites %d' % (clock.get_fps(), len(globs.sprites)))
+        if _stats_font is None:
+            _stats_font = pygame.font.SysFont('monospace', 14)
+        font = _stats_font
+        line_height = font.get_linesize()
+        _stats_surface = pygame.Surface((260, line_height * len(lines) + 10))
+        _stats_surface.fill((20, 20, 20))
+        for idx, line in enumerate(lines):
+            _stats_surface.blit(font.render(line, True, (235, 235, 235)), (5, 5 + idx * line_height))
+    rect = _stats_surface.get_rect(topleft=(10, globs.HEIGHT // 3))
+    SURF.blit(_stats_surface, rect)
+    return rect
+
 def _draw(SURF):
+    """ draw the scene. returns the changed rectangles when using the dirty rectangle
+        renderer or None if the whole screen needs to be updated """
+    start = perf_counter()
+    rects = None
+    if DIRTY_RECTS:
+        rects = _draw_dirty(SURF)
+    else:
+        _draw_full(SURF)
+    if show_stats:
+        rect = _draw_stats(SURF)
+        if rects is not None:
+            rects.append(rect)
+    profiler.add('draw', start)
+    return rects
+
+def _blit_all(SURF, sprites):
+    """ draw sprites in order. sprites using the default `Sprite._draw` are batched
+        into `blits()` calls, sprites with their own `_draw` are drawn in between """
+    batch = []
+    for sprite in sprites:
+        # `_draw` can be overridden by a subclass or on a single sprite
+        if type(sprite)._draw is Sprite._draw and '_draw' not in getattr(sprite, '__dict__', ()):
+            batch.append((sprite.surface, sprite.rect))
+        else:
+            if batch:
+                SURF.blits(batch, False)
+                batch = []
+            sprite._draw(SURF)
+    if batch:
+        SURF.blits(batch, False)
+
+def _draw_full(SURF):
 
     if isinstance(_background, pygame.Surface) :
         SURF.blit(_background, (0,0))
     else:
         SURF.fill(_background_color)
 
-    for sprite in globs.backgrounds:
-        sprite._draw(SURF)
-
-    globs.cells = {}
-    for sprite in globs.sprites:
-        register_cell(sprite.pos, sprite)
-        sprite._draw(SURF)
+    _blit_all(SURF, globs.backgrounds)
+    _blit_all(SURF, globs.sprites)
 
 
     if show_grid:
@@ -783,7 +1130,11 @@ def _draw(SURF):
 
 def main_loop():
     global update_game
-    for event in pygame.event.get():
+    rects = None
+    profiler.begin()
+    start = perf_counter()
+    delta, mouse, events = _frame_input()
+    for event in events:
 
         if event.type == QUIT:
             pygame.quit()
@@ -822,6 +1173,9 @@ def main_loop():
             if key == 'f12':
                 screenshot()
 
+            if key == 'f10':
+                _toggle_stats()
+
         if event.type == KEYUP:
             key = pygame.key.name(event.key)
             if key in globs.keys_registered['keyup']:
@@ -839,22 +1193,34 @@ def main_loop():
         if event.type == USEREVENT:
             if event.action == 'pause' and update_game and not game_over:
                 update_game = False
-                _update(clock.get_time())
-                _draw(SURF)
+                _update(delta)
+                rects = _draw(SURF)
+    profiler.add('events', start)
 
     if display_active == DISPLAY_MAIN and (update_game and not game_over):
-        mx, my = pygame.mouse.get_pos()
+        mx, my = mouse
         for sprite in globs.mouse_motion:
                 sprite.pos = (mx/globs.GRID_SIZE - sprite.width/2,
                     my/globs.GRID_SIZE - sprite.height/2)
-        _update(clock.get_time())
-        _draw(SURF)
+        _step(delta)
+        rects = _draw(SURF)
 
     if display_active != DISPLAY_MAIN:
-        displays[display_active][1].update(clock.get_time())
+        displays[display_active][1].update(delta)
         displays[display_active][1].draw(displays[display_active][0])
+        rects = None
 
+    start = perf_counter()
+    if not HEADLESS:
+        if rects is not None:
+            pygame.display.update(rects)
+        else:
+            pygame.display.flip()
+    profiler.add('display', start)
+    profiler.end()
 
-
-    pygame.display.flip()
-    clock.tick(FPS)
+    if HEADLESS:
+        # run uncapped, nothing to show
+        clock.tick()
+    else:
+        clock.tick(FPS)
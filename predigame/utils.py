@@ -7,7 +7,6 @@ from astar import AStar
 from functools import partial
 from math import ceil
 from bresenham import bresenham
-import copy
 
 def load_module(path, api):
     src = open(path).read()
@@ -43,16 +42,39 @@ def import_plugins(prefix = None):
     return plugins
 
 def register_cell(pos, s):
-    """ helper function that builds the index of all sprites in a given cell """
-    area = to_area(s.x, s.y, s.width, s.height)
-    for p in area:
+    """ helper function that maintains the index of all sprites in a given cell. the
+        index is persistent - a sprite is only re-indexed when the cells it covers change """
+    key = (s.x, s.y, s.width, s.height)
+    if key == s._cell_key:
+        return
+    unregister_cell(s)
+    s._cell_key = key
+    s._cells = to_area(s.x, s.y, s.width, s.height)
+    cells = Globals.instance.cells
+    for p in s._cells:
         lst = []
-        if p in Globals.instance.cells:
-            lst = Globals.instance.cells[p]
+        if p in cells:
+            lst = cells[p]
         else:
-            Globals.instance.cells[p] = lst
+            cells[p] = lst
         lst.append(s)
 
+def unregister_cell(s):
+    """ helper function that removes a sprite from the cell index """
+    if s._cells is None:
+        return
+    cells = Globals.instance.cells
+    for p in s._cells:
+        lst = cells.get(p)
+        if lst is None:
+            continue
+        if s in lst:
+            lst.remove(s)
+        if len(lst) == 0:
+            del cells[p]
+    s._cells = None
+    s._cell_key = None
+
 def register_keydown(key, callback):
     # single key callbacks
     Globals.instance.keys_registered['keydown'][key] = set([callback])
@@ -71,18 +93,10 @@ def register_keyup(key, callback):
     #    Globals.instance.keys_registered['keyup'][key] = set([callback])
 
 def has_animation(obj, action=GRAVITY):
-    for o in Globals.instance.animations:
-        if o.obj == obj and o.action == action:
-            return True
-    else:
-        return False
-
-
+    return Globals.instance.animations.has(obj, action)
 
 def get_animation(obj):
-    for o in Globals.instance.animations:
-        if o.obj == obj:
-            return o
+    return Globals.instance.animations.get(obj)
 
 
 def animate(obj, duration = 1, callback = None, abortable=False, action=None, **kwargs):
@@ -96,7 +110,8 @@ def at(pos):
         elif len(lst) == 1:
             return lst[0]
         else:
-            return lst
+            # a copy, the index changes when the sprites move or are destroyed
+            return list(lst)
 
 def to_grid(screen_pos):
     """ converts screen coordinates to grid coordinates """
@@ -178,7 +193,7 @@ def max_distance(posA, posB, width, height, skip_up=True):
 
 def get(name):
     if name in Globals.instance.tags:
-        return copy.copy(Globals.instance.tags[name])
+        return list(Globals.instance.tags[name])
     else:
         return []
 